@@ -0,0 +1,55 @@
+# Shared setup for the benchmark scripts in this directory.
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import support
+
+
+def import_bot():
+    # The benchmarks write their leagues next to the league_data.db of the
+    # import, in the scratch directory the tests use too
+    bot = support.import_bot()
+    os.chdir(support.scratch_dir())
+    return bot
+
+
+def build_league(bot, path, team_count, team_size=10, seed=0):
+    # A league of team_count teams with team_size players each, written
+    # straight to the tables load_data reads. Player ids are Discord-sized
+    # snowflakes; team t's captain is its first player.
+    rng = random.Random(seed)
+    players = [
+        rng.randrange(10**17, 10**18) for _ in range(team_count * team_size)
+    ]
+    league = bot.LeagueData(path)
+    cursor = league.cursor
+    cursor.execute("BEGIN")
+    cursor.executemany(
+        "INSERT INTO teams (team_name, captain_id, division) VALUES (?, ?, ?)",
+        [(f"Team {t}", players[t * team_size], f"Division {t % 4 + 1}")
+         for t in range(team_count)])
+    cursor.executemany(
+        "INSERT INTO team_captains (captain_id, team_name) VALUES (?, ?)",
+        [(players[t * team_size], f"Team {t}") for t in range(team_count)])
+    cursor.executemany(
+        "INSERT INTO team_players (team_name, player_id, position) VALUES (?, ?, ?)",
+        [(f"Team {i // team_size}", player_id, i % team_size)
+         for i, player_id in enumerate(players)])
+    cursor.executemany(
+        "INSERT INTO player_stats (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(player_id, *(rng.randint(0, 50) for _ in range(6)))
+         for player_id in players])
+    cursor.executemany(
+        "INSERT INTO standings (team_name, wins, losses, draws, goals_for, goals_against, points) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(f"Team {t}", w, l, d, rng.randint(0, 90), rng.randint(
+            0, 90), w * bot.POINTS_FOR_WIN + d * bot.POINTS_FOR_DRAW)
+         for t in range(team_count)
+         for w, l, d in [(rng.randint(0, 20), rng.randint(0, 20),
+                          rng.randint(0, 10))]])
+    cursor.execute("COMMIT")
+    league.close()
+    return players
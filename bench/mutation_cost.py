@@ -0,0 +1,45 @@
+# Cost of one roster change (add_player + save_data) against league size.
+# save_data only writes the rows that changed, so the time per save should
+# stay flat from a hundred teams to ten thousand.
+#
+#   python bench/mutation_cost.py [team counts...]
+import asyncio
+import sys
+import time
+
+from common import build_league, import_bot
+
+SAVES = 200
+
+
+async def time_saves(league, team_name, player_ids):
+    started = time.perf_counter()
+    for player_id in player_ids:
+        league.add_player(team_name, player_id)
+        await league.save_data()
+    added = time.perf_counter() - started
+    started = time.perf_counter()
+    for player_id in player_ids:
+        league.remove_player(team_name, player_id)
+        await league.save_data()
+    return added, time.perf_counter() - started
+
+
+def main():
+    bot = import_bot()
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    print(f"{'teams':>8} {'add_player':>12} {'remove_player':>14}")
+    for team_count in sizes:
+        path = f"league_{team_count}.db"
+        build_league(bot, path, team_count)
+        league = bot.LeagueData(path)
+        league.load_data()
+        added, removed = asyncio.run(
+            time_saves(league, "Team 0", range(1, SAVES + 1)))
+        league.close()
+        print(f"{team_count:>8} {added / SAVES * 1000:>9.3f} ms "
+              f"{removed / SAVES * 1000:>11.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Startup cost against league size: time for LeagueData to open the database
+# and run load_data, and the peak RSS of the process afterwards. Each league
+# is loaded in a fresh interpreter so the RSS peaks don't carry over.
+#
+#   python bench/startup.py [player counts...]
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from common import build_league, import_bot
+
+TEAM_SIZE = 10
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def load(path):
+    bot = import_bot()
+    before = peak_rss_mb()
+    started = time.perf_counter()
+    league = bot.LeagueData(path)
+    league.load_data()
+    elapsed = time.perf_counter() - started
+    print(
+        json.dumps({
+            'seconds': elapsed,
+            'peak_rss': peak_rss_mb(),
+            'import_rss': before
+        }))
+    league.close()
+
+
+def main():
+    bot = import_bot()
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"{'players':>8} {'teams':>7} {'load_data':>11} {'peak RSS':>10} "
+          f"{'over import':>12}")
+    for player_count in sizes:
+        team_count = max(1, player_count // TEAM_SIZE)
+        path = os.path.abspath(f"league_{player_count}.db")
+        build_league(bot, path, team_count, TEAM_SIZE)
+        output = subprocess.run(
+            [sys.executable,
+             os.path.abspath(__file__), '--load', path],
+            check=True,
+            capture_output=True,
+            text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{player_count:>8} {team_count:>7} "
+              f"{result['seconds'] * 1000:>8.1f} ms "
+              f"{result['peak_rss']:>7.1f} MB "
+              f"{result['peak_rss'] - result['import_rss']:>9.1f} MB")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--load']:
+        load(sys.argv[2])
+    else:
+        main()
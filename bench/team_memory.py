@@ -0,0 +1,62 @@
+# Memory held by the in-memory teams: the old dict-of-dicts with a players
+# list against Team records with array rosters, measured with tracemalloc.
+# Player ids are created inside the measurement, as load_data creates them
+# from the rows it reads.
+#
+#   python bench/team_memory.py [team count] [team size]
+import gc
+import random
+import sys
+import tracemalloc
+from array import array
+
+from common import import_bot
+
+
+def as_dicts(bot, team_count, team_size, rng):
+    teams = {}
+    for t in range(team_count):
+        players = [rng.randrange(10**17, 10**18) for _ in range(team_size)]
+        teams[f"Team {t}"] = {
+            'captain_id': players[0],
+            'players': players,
+            'division': f"Division {t % 4 + 1}"
+        }
+    return teams
+
+
+def as_records(bot, team_count, team_size, rng):
+    teams = {}
+    for t in range(team_count):
+        players = array('q', (rng.randrange(10**17, 10**18)
+                              for _ in range(team_size)))
+        teams[f"Team {t}"] = bot.Team(players[0], players,
+                                      f"Division {t % 4 + 1}")
+    return teams
+
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    teams = build(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del teams
+    return current
+
+
+def main():
+    bot = import_bot()
+    team_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    team_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    players = team_count * team_size
+    print(f"{team_count} teams of {team_size} players")
+    for name, build in (("dict + list", as_dicts), ("Team + array",
+                                                    as_records)):
+        held = measure(build, bot, team_count, team_size, random.Random(0))
+        print(f"{name:>13}: {held / 1e6:6.1f} MB "
+              f"({held / players:.0f} B/player)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,20 @@
 from dotenv import load_dotenv
+from array import array
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import csv
+import functools
+import hashlib
+import io
+import logging
+import queue
+from collections import Counter
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pytz
 from typing import Dict, List, Optional
@@ -7,6 +22,7 @@ import os
 import random
 
 load_dotenv()
+from aiohttp import web
 import discord
 from discord import app_commands
 from discord.ext import commands
@@ -18,19 +34,906 @@ ANNOUNCEMENT_CHANNEL_ID = int(os.getenv("ANNOUNCEMENT_CHANNEL_ID"))
 RESULTS_CHANNEL_ID = int(os.getenv("RESULTS_CHANNEL_ID"))
 ADMIN_CHANNEL_ID = int(os.getenv("ADMIN_CHANNEL_ID"))
 REPORT_SCORES_CHANNEL_ID = int(os.getenv("REPORT_SCORES_CHANNEL_ID"))
+# Every guild runs its own league in LEAGUE_DATA_DIR; the guild in
+# LEAGUE_GUILD_ID keeps using league_data.db. Without LEAGUE_GUILD_ID a
+# league already in league_data.db goes to the bot's only guild, and with
+# several guilds the bot stops instead of picking one. SHARD_COUNT
+# overrides the shard count Discord recommends.
+LEAGUE_DATA_DIR = os.getenv("LEAGUE_DATA_DIR", "leagues")
+LEAGUE_GUILD_ID = int(os.getenv("LEAGUE_GUILD_ID") or 0) or None
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or 0) or None
+# Prometheus scrape endpoint (GET /metrics); METRICS_PORT=0 turns it off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Reader threads shared by every league, and the most write jobs grouped
+# into a single commit
+DB_READ_POOL_SIZE = 8
+DB_MAX_WRITE_BATCH = 64
+
+# Queries on the hot command paths. LeagueData.check_query_plans verifies that
+# none of them falls back to a full table scan.
+# The list queries are keyset-paginated: each page starts after the sort key
+# of the last row of the previous page
+SCHEDULED_MATCHES_PAGE_QUERY = """
+    SELECT match_id, team1_name, team2_name, scheduled_time, status
+    FROM scheduled_matches
+    WHERE status = 'scheduled' AND (scheduled_time, match_id) > (?, ?)
+    ORDER BY scheduled_time, match_id
+    LIMIT ?
+"""
+TEAMS_PAGE_QUERY = """
+    SELECT team_name, captain_id FROM teams
+    WHERE team_name > ?
+    ORDER BY team_name
+    LIMIT ?
+"""
+TEAM_PLAYERS_PAGE_QUERY = """
+    SELECT position, player_id FROM team_players
+    WHERE team_name = ? AND position > ?
+    ORDER BY position
+    LIMIT ?
+"""
+MATCH_TEAMS_QUERY = "SELECT team1_name, team2_name, status FROM scheduled_matches WHERE match_id = ?"
+
+# Leaderboard ranking expressions per (competition, stat). Each one has an
+# index on exactly that expression, so a top-N read walks the index.
+LEADERBOARD_EXPRESSIONS = {
+    ('league', 'goals'):
+    'goals',
+    ('league', 'assists'):
+    'assists',
+    ('league', 'saves'):
+    'saves',
+    ('league', 'total'):
+    'goals + assists + saves',
+    ('champions_league', 'goals'):
+    'champions_league_goals',
+    ('champions_league', 'assists'):
+    'champions_league_assists',
+    ('champions_league', 'saves'):
+    'champions_league_saves',
+    ('champions_league', 'total'):
+    'champions_league_goals + champions_league_assists + champions_league_saves'
+}
+LEADERBOARD_SIZE = 10
+
+
+def leaderboard_query(competition, stat):
+    expression = LEADERBOARD_EXPRESSIONS[(competition, stat)]
+    return f"""
+        SELECT player_id, {expression} FROM player_stats
+        WHERE {expression} > 0
+        ORDER BY {expression} DESC
+        LIMIT ?
+    """
+
+
+PLAYER_FORM_QUERY = """
+    SELECT match_id, competition, team, goals, assists, saves
+    FROM player_match_stats
+    WHERE player_id = ?
+    ORDER BY match_id DESC
+    LIMIT ?
+"""
+MATCH_STATS_QUERY = """
+    SELECT player_id, competition, team, goals, assists, saves
+    FROM player_match_stats
+    WHERE match_id = ?
+"""
+FORM_MATCHES = 5
+
+HOT_QUERIES = {
+    'list_matches': (SCHEDULED_MATCHES_PAGE_QUERY, ('', 0, 10)),
+    'list_teams': (TEAMS_PAGE_QUERY, ('', 10)),
+    'list_players': (TEAM_PLAYERS_PAGE_QUERY, ('Team', -1, 10)),
+    'set_score': (MATCH_TEAMS_QUERY, (1, )),
+    'stats form': (PLAYER_FORM_QUERY, (1, FORM_MATCHES)),
+    'match_stats': (MATCH_STATS_QUERY, (1, ))
+}
+HOT_QUERIES.update({
+    f"leaderboard {competition} {stat}":
+    (leaderboard_query(competition, stat), (LEADERBOARD_SIZE, ))
+    for competition, stat in LEADERBOARD_EXPRESSIONS
+})
+
+POINTS_FOR_WIN = 3
+POINTS_FOR_DRAW = 1
+STANDINGS_PAGE_SIZE = 20
+# Rows per page in the paginated list views (Discord allows 25 fields)
+LIST_PAGE_SIZE = 10
+# Fixture generation defaults for initiate_league
+MATCHDAY_SPACING_DAYS = 7
+MAX_MATCHDAY_SPACING_DAYS = 60
+MATCH_TIME_SLOTS = "19:00,20:00,21:00"
+# Champions League draw: the top teams of each division are drawn into groups
+CHAMPIONS_LEAGUE_DIVISIONS = [
+    "Division 1", "Division 2", "Division 3", "Division 4"
+]
+CHAMPIONS_LEAGUE_QUALIFIERS = 4
+CHAMPIONS_LEAGUE_GROUPS = 4
+# A draw that needs more placements than this starts over with a fresh
+# shuffle (short restarts beat deep backtracking), and gives up after
+# DRAW_ATTEMPTS tries
+DRAW_NODE_BUDGET = 1000
+DRAW_ATTEMPTS = 50
+# Results import: problems listed before the import is aborted, and the
+# match ids looked up per query
+MAX_IMPORT_ERRORS = 10
+IMPORT_LOOKUP_CHUNK = 500
+# Announcements queued within this many seconds of each other go out as one
+# message; sends rejected with 429 are retried with backoff
+ANNOUNCEMENT_WINDOW = 2.0
+ANNOUNCEMENT_RETRIES = 5
+ANNOUNCEMENT_RETRY_DELAY = 1.0
+# Discord limits per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+# Member role edits running at the same time
+ROLE_EDIT_CONCURRENCY = 5
+# Rows read per fetchmany while rebuilding aggregates from match history
+REBUILD_BATCH_SIZE = 5000
+# How often each league checks its database for changes committed by other
+# processes, and how many change_log entries are kept for them to read
+CHANGE_POLL_INTERVAL = 1.0
+CHANGE_LOG_RETENTION = 10000
+# Guild leagues unused for this long are closed, releasing their writer
+# thread and connections. Longer than an interaction stays valid (15
+# minutes), so no modal or view outlives the league it was opened on.
+LEAGUE_IDLE_TIMEOUT = 1800
+
+# Tables derived from match history; rebuild_aggregates recreates them
+# under a shadow name and swaps them in
+AGGREGATE_TABLES = {
+    'player_stats':
+    '''(
+            player_id INTEGER PRIMARY KEY,
+            goals INTEGER,
+            assists INTEGER,
+            saves INTEGER,
+            champions_league_goals INTEGER DEFAULT 0,
+            champions_league_assists INTEGER DEFAULT 0,
+            champions_league_saves INTEGER DEFAULT 0
+        )''',
+    'standings':
+    '''(
+            team_name TEXT PRIMARY KEY,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            draws INTEGER DEFAULT 0,
+            goals_for INTEGER DEFAULT 0,
+            goals_against INTEGER DEFAULT 0,
+            points INTEGER DEFAULT 0,
+            FOREIGN KEY (team_name) REFERENCES teams(team_name)
+        )''',
+    'champions_league_standings':
+    '''(
+            team_name TEXT PRIMARY KEY,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            draws INTEGER DEFAULT 0,
+            goals_for INTEGER DEFAULT 0,
+            goals_against INTEGER DEFAULT 0,
+            points INTEGER DEFAULT 0,
+            FOREIGN KEY (team_name) REFERENCES champions_league_teams(team_name)
+        )'''
+}
+# Tables whose changes other processes sharing the database have to pick up,
+# with the column naming the changed in-memory entry (None: the table only
+# feeds aggregates or cached views, which are reloaded or dropped whole)
+CHANGE_LOG_TABLES = {
+    'teams': 'team_name',
+    'team_captains': 'captain_id',
+    'team_players': 'team_name',
+    'champions_league_teams': None,
+    'player_stats': None,
+    'standings': None,
+    'champions_league_standings': None,
+    'scheduled_matches': None,
+    'match_results': None,
+    'champions_league_match_results': None
+}
+# Changes to these tables reload the stats totals and both standings
+AGGREGATE_SOURCES = ('champions_league_teams', 'player_stats', 'standings',
+                     'champions_league_standings')
+MATCH_TABLES = ('scheduled_matches', 'match_results',
+                'champions_league_match_results')
+# Only the league-wide totals of player_stats are kept in memory; a player's
+# own row is read when a command asks for it
+PLAYER_STATS_TOTALS_QUERY = "SELECT TOTAL(goals), TOTAL(assists), TOTAL(saves), TOTAL(champions_league_goals), TOTAL(champions_league_assists), TOTAL(champions_league_saves) FROM player_stats"
+PLAYER_STATS_COLUMNS = ('goals', 'assists', 'saves', 'champions_league_goals',
+                        'champions_league_assists', 'champions_league_saves')
+STANDINGS_LOAD_QUERY = """
+    SELECT s.team_name, t.division, s.wins, s.losses, s.draws,
+           s.goals_for, s.goals_against, s.points
+    FROM standings s LEFT JOIN teams t ON t.team_name = s.team_name
+"""
+CHAMPIONS_LEAGUE_STANDINGS_LOAD_QUERY = """
+    SELECT s.team_name, t.division, s.wins, s.losses, s.draws,
+           s.goals_for, s.goals_against, s.points
+    FROM champions_league_standings s
+    LEFT JOIN champions_league_teams t ON t.team_name = s.team_name
+"""
+
+log = logging.getLogger(__name__)
+
+
+class MatchAlreadyReported(Exception):
+    pass
+
+
+class MatchNotFound(Exception):
+    pass
+
+
+# A team in memory. The roster is a compact array of player ids in roster
+# order; a slotted record with an int64 array takes a fraction of the space
+# of a dict holding a list of int objects.
+class Team:
+    __slots__ = ('captain_id', 'players', 'division')
+
+    def __init__(self, captain_id, players=(), division=''):
+        self.captain_id = captain_id
+        self.players = array('q', players)
+        self.division = division
+
+
+# "goals/assists/saves" lines, one per player in roster order. Raises
+# ValueError on anything but three whole numbers of at least 0.
+def parse_stats_lines(text):
+    stats = []
+    for line in text.strip().split('\n'):
+        if line.strip():
+            goals, assists, saves = map(int, line.strip().split('/'))
+            if min(goals, assists, saves) < 0:
+                raise ValueError("stats cannot be negative")
+            stats.append((goals, assists, saves))
+    return stats
+
+
+# Records of a results file, read as they are parsed: CSV with a header row,
+# a JSON array, or JSON Lines. Yields (row number, record).
+def read_result_records(filename, data):
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith('.csv'):
+        reader = csv.DictReader(io.StringIO(text))
+        for record in reader:
+            yield reader.line_num, record
+    elif text.lstrip().startswith('['):
+        yield from enumerate(json.loads(text), start=1)
+    else:
+        for number, line in enumerate(io.StringIO(text), start=1):
+            if line.strip():
+                yield number, json.loads(line)
+
+
+# Validate one imported result against its scheduled match and the current
+# rosters. Fields: match_id, team1_score, team2_score, team1_stats,
+# team2_stats and optionally competition ("league" or "champions_league").
+# Stats are goals/assists/saves lines in roster order, separated by newlines
+# or semicolons. Returns the arguments for LeagueData.record_match_result,
+# raises ValueError with the reason otherwise.
+def parse_result_record(record, matches, teams):
+    try:
+        match_id = int(record['match_id'])
+        score1 = int(record['team1_score'])
+        score2 = int(record['team2_score'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(
+            "match_id, team1_score and team2_score must be whole numbers")
+    if score1 < 0 or score2 < 0:
+        raise ValueError("scores cannot be negative")
+    competition = str(record.get('competition') or 'league').strip().lower()
+    if competition not in ('league', 'champions_league'):
+        raise ValueError("competition must be league or champions_league")
+
+    match = matches.get(match_id)
+    if match is None:
+        raise ValueError(f"match #{match_id} is not scheduled")
+    team1_name, team2_name, status = match
+    if status == 'completed':
+        raise ValueError(f"match #{match_id} has already been reported")
+
+    players_and_stats = []
+    for team_name, score, field in ((team1_name, score1, 'team1_stats'),
+                                    (team2_name, score2, 'team2_stats')):
+        if team_name not in teams:
+            raise ValueError(f"team {team_name} no longer exists")
+        # A snapshot, the result is written on the writer thread
+        players = list(teams[team_name].players)
+        try:
+            stats = parse_stats_lines(
+                str(record.get(field) or '').replace(';', '\n'))
+        except ValueError:
+            raise ValueError(
+                f"{field} must be goals/assists/saves lines of whole numbers of at least 0 (e.g. 2/1/0)"
+            )
+        if len(stats) > len(players):
+            raise ValueError(
+                f"{field} has {len(stats)} lines but {team_name} has {len(players)} players"
+            )
+        total_goals = sum(goals for goals, _, _ in stats)
+        if total_goals != score:
+            raise ValueError(
+                f"total goals ({total_goals}) doesn't match {team_name}'s score ({score})"
+            )
+        players_and_stats += [players, stats]
+
+    team1_players, team1_stats, team2_players, team2_stats = players_and_stats
+    return (match_id, team1_name, team2_name, score1, score2, team1_players,
+            team1_stats, team2_players, team2_stats,
+            competition == 'champions_league')
+
+
+# Double round-robin as a Berger table: the last team stays put while the
+# others rotate one place per round. Returns the rounds as lists of
+# (home, away); with an odd number of teams one team sits out each round.
+# Pairs are oriented so that each team has at most one home/away break per
+# half, and the mirrored second half starts from the second round, so nobody
+# plays more than two home or two away games in a row.
+def round_robin(teams):
+    teams = list(teams)
+    if not teams:
+        return []
+    if len(teams) % 2:
+        teams.append(None)
+    count = len(teams)
+    circle, fixed = teams[:-1], teams[-1]
+    rounds = []
+    for round_index in range(count - 1):
+        pairs = [(fixed, circle[round_index]) if round_index % 2 == 0 else
+                 (circle[round_index], fixed)]
+        for offset in range(1, count // 2):
+            first = circle[(round_index + offset) % (count - 1)]
+            second = circle[(round_index - offset) % (count - 1)]
+            pairs.append((first, second) if offset % 2 else (second, first))
+        rounds.append([(home, away) for home, away in pairs
+                       if home is not None and away is not None])
+    return rounds + [[(away, home) for home, away in pairs]
+                     for pairs in rounds[1:] + rounds[:1]]
+
+
+class DrawImpossible(Exception):
+    pass
+
+
+# Champions League group draw. teams are (team_name, division, pot) with pot 1
+# holding the division winners, pot 2 the runners-up and so on. Pots are
+# drawn in order, and each group takes at most its share of every pot and of
+# every division (one of each when the numbers allow), with group sizes
+# differing by at most one. Within a pot the team with the fewest groups
+# left goes next, into the emptiest group that takes it; placement
+# backtracks, and after every placement the teams
+# it could block are checked to still have a group left. Backtracking is
+# capped at DRAW_NODE_BUDGET placements per attempt. All randomness comes
+# from rng, so a seeded rng reproduces the draw.
+def draw_groups(teams, group_count, rng):
+
+    def share(count):
+        return -(-count // group_count)
+
+    pot_limits = {
+        pot: share(count)
+        for pot, count in Counter(pot for _, _, pot in teams).items()
+    }
+    division_limits = {
+        division: share(count)
+        for division, count in Counter(
+            division for _, division, _ in teams).items()
+    }
+    capacity = share(len(teams))
+    minimum = len(teams) // group_count
+
+    def fits(team, group):
+        _, division, pot = team
+        return (len(groups[group]) < capacity
+                and group_pots[group][pot] < pot_limits[pot] and
+                group_divisions[group][division] < division_limits[division])
+
+    def place(remaining):
+        nonlocal nodes
+        if not remaining:
+            return True
+        # Enough teams left to bring every group up to the minimum size?
+        if sum(max(0, minimum - len(group))
+               for group in groups) > len(remaining):
+            return False
+        best = None
+        for index, team in enumerate(remaining):
+            if team[2] != remaining[0][2]:
+                break
+            candidates = [
+                group for group in range(group_count) if fits(team, group)
+            ]
+            if best is None or len(candidates) < len(best[2]):
+                best = (index, team, candidates)
+        index, team, candidates = best
+        _, division, pot = team
+        rest = remaining[:index] + remaining[index + 1:]
+        # Random order, but the emptiest groups first
+        rng.shuffle(candidates)
+        candidates.sort(key=lambda group: len(groups[group]))
+        for group in candidates:
+            nodes += 1
+            if nodes > DRAW_NODE_BUDGET:
+                return False
+            groups[group].append(team)
+            group_pots[group][pot] += 1
+            group_divisions[group][division] += 1
+            full = len(groups[group]) == capacity
+            if all(
+                    any(
+                        fits(other, other_group)
+                        for other_group in range(group_count))
+                    for other in rest if full or other[1] == division
+                    or other[2] == pot) and place(rest):
+                return True
+            groups[group].pop()
+            group_pots[group][pot] -= 1
+            group_divisions[group][division] -= 1
+        return False
+
+    for _ in range(DRAW_ATTEMPTS):
+        order = []
+        for pot in sorted(pot_limits):
+            pot_teams = [team for team in teams if team[2] == pot]
+            rng.shuffle(pot_teams)
+            order += pot_teams
+        groups = [[] for _ in range(group_count)]
+        group_pots = [Counter() for _ in range(group_count)]
+        group_divisions = [Counter() for _ in range(group_count)]
+        nodes = 0
+        if place(order):
+            return [[team_name for team_name, _, _ in group]
+                    for group in groups]
+        # A proof of impossibility within the budget is final
+        if nodes <= DRAW_NODE_BUDGET:
+            break
+    raise DrawImpossible()
+
+
+# (team1, team2, scheduled_time) for every division's double round-robin.
+# Match day n of all divisions falls on first_day + n * spacing_days, and the
+# games of a match day are spread over the time slots in turn. Raises
+# OverflowError when the season would run past the last date datetime
+# supports.
+def generate_fixtures(divisions, first_day, spacing_days, time_slots):
+    fixtures = []
+    for division_teams in divisions.values():
+        for round_index, pairs in enumerate(round_robin(division_teams)):
+            match_day = first_day + timedelta(days=round_index * spacing_days)
+            for i, (home, away) in enumerate(pairs):
+                kickoff = datetime.combine(match_day,
+                                           time_slots[i % len(time_slots)])
+                fixtures.append(
+                    (home, away, kickoff.strftime("%Y-%m-%d %H:%M:%S")))
+    return fixtures
+
+
+# Standings kept in rank order in memory, for the whole table and per
+# division. A result only re-positions the two teams involved, so reading a
+# page is a slice and nothing is sorted at read time.
+class StandingsTable:
+
+    def __init__(self):
+        self.rows = {}  # team_name -> standings row
+        self._ranked = {None: []}  # division (None = all teams) -> rank keys
+
+    @staticmethod
+    def _rank_key(team_name, row):
+        # Points, then goal difference, then goals scored
+        return (-row['points'], row['goals_against'] - row['goals_for'],
+                -row['goals_for'], team_name)
+
+    def _link(self, team_name):
+        row = self.rows[team_name]
+        key = self._rank_key(team_name, row)
+        bisect.insort(self._ranked[None], key)
+        bisect.insort(self._ranked.setdefault(row['division'], []), key)
+
+    def _unlink(self, team_name):
+        row = self.rows[team_name]
+        key = self._rank_key(team_name, row)
+        for ranked in (self._ranked[None], self._ranked[row['division']]):
+            del ranked[bisect.bisect_left(ranked, key)]
+
+    def load(self, rows):
+        # rows: (team_name, division, wins, losses, draws, goals_for,
+        # goals_against, points)
+        self.rows = {}
+        self._ranked = {None: []}
+        for (team_name, division, wins, losses, draws, goals_for,
+             goals_against, points) in rows:
+            row = {
+                'division': division or '',
+                'wins': wins or 0,
+                'losses': losses or 0,
+                'draws': draws or 0,
+                'goals_for': goals_for or 0,
+                'goals_against': goals_against or 0,
+                'points': points or 0
+            }
+            self.rows[team_name] = row
+            key = self._rank_key(team_name, row)
+            self._ranked[None].append(key)
+            self._ranked.setdefault(row['division'], []).append(key)
+        for ranked in self._ranked.values():
+            ranked.sort()
+
+    def add_team(self, team_name, division=''):
+        if team_name in self.rows:
+            return
+        self.rows[team_name] = {
+            'division': division or '',
+            'wins': 0,
+            'losses': 0,
+            'draws': 0,
+            'goals_for': 0,
+            'goals_against': 0,
+            'points': 0
+        }
+        self._link(team_name)
+
+    def remove_team(self, team_name):
+        if team_name in self.rows:
+            self._unlink(team_name)
+            del self.rows[team_name]
+
+    def set_division(self, team_name, division):
+        if team_name not in self.rows:
+            self.add_team(team_name, division)
+            return
+        self._unlink(team_name)
+        self.rows[team_name]['division'] = division or ''
+        self._link(team_name)
+
+    def reset(self, team_name):
+        division = self.rows[team_name]['division']
+        self.remove_team(team_name)
+        self.add_team(team_name, division)
+
+    def record_result(self, team1_name, team2_name, score1, score2):
+        self.add_team(team1_name)
+        self.add_team(team2_name)
+        self._unlink(team1_name)
+        self._unlink(team2_name)
+        for team_name, scored, conceded in ((team1_name, score1, score2),
+                                            (team2_name, score2, score1)):
+            row = self.rows[team_name]
+            row['goals_for'] += scored
+            row['goals_against'] += conceded
+            if scored > conceded:
+                row['wins'] += 1
+                row['points'] += POINTS_FOR_WIN
+            elif scored < conceded:
+                row['losses'] += 1
+            else:
+                row['draws'] += 1
+                row['points'] += POINTS_FOR_DRAW
+        self._link(team1_name)
+        self._link(team2_name)
+
+    def count(self, division=None):
+        return len(self._ranked.get(division, ()))
+
+    def page(self, division=None, offset=0, limit=10):
+        # [(rank, team_name, row)] for one page of the table
+        ranked = self._ranked.get(division, [])
+        return [(offset + i + 1, key[-1], self.rows[key[-1]])
+                for i, key in enumerate(ranked[offset:offset + limit])]
+
+
+def _resolve_future(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+# Latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+# Rows in each section of the /metrics embed
+METRICS_EMBED_ROWS = 10
+
+# Name of the command or modal the current task is serving; SQL run on its
+# behalf is attributed to it
+current_command = contextvars.ContextVar('current_command', default=None)
+# Statements run by the SQLite connections of the current thread
+_statement_counts = threading.local()
+
+
+# Connection whose cursors count the statements they run. A trace callback
+# would also see every trigger statement and pay for expanding the SQL.
+class CountingCursor(sqlite3.Cursor):
+
+    def execute(self, *args):
+        _statement_counts.value = getattr(_statement_counts, 'value', 0) + 1
+        return super().execute(*args)
+
+    def executemany(self, *args):
+        _statement_counts.value = getattr(_statement_counts, 'value', 0) + 1
+        return super().executemany(*args)
+
+
+class CountingConnection(sqlite3.Connection):
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank, seen = q * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def _labels(**labels):
+    return ",".join('{}="{}"'.format(
+        name,
+        str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+            '\n', '\\n')) for name, value in labels.items())
+
+
+# Process-wide instrumentation: latency per slash command, prefix command and
+# modal submit, SQL statements and time per command, Discord REST calls and
+# 429s. Recorded from the event loop and the database threads alike.
+class Metrics:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.latency = {}  # (kind, name) -> Histogram
+        self.failures = Counter()  # (kind, name)
+        self.sql_time = {}  # (command, access) -> Histogram
+        self.sql_statements = Counter()  # (command, access)
+        self.rest_calls = Counter()  # (method, route, status)
+        self.rate_limited = Counter()  # source
+
+    def observe_command(self, kind, name, seconds, failed=False):
+        with self._lock:
+            histogram = self.latency.get((kind, name))
+            if histogram is None:
+                histogram = self.latency[(kind, name)] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                self.failures[(kind, name)] += 1
+
+    @contextlib.contextmanager
+    def track(self, kind, name):
+        token = current_command.set(name)
+        started = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            current_command.reset(token)
+            self.observe_command(kind, name,
+                                 time.perf_counter() - started, failed)
+
+    def timed(self, kind):
+        # Decorator for interaction callbacks such as modal submits, named
+        # after the class they belong to
+        def decorator(func):
+
+            @functools.wraps(func)
+            async def wrapper(owner, interaction, *args):
+                with self.track(kind, type(owner).__name__):
+                    return await func(owner, interaction, *args)
+
+            return wrapper
+
+        return decorator
+
+    def observe_interaction(self, interaction, failed=False):
+        # Slash commands, timed from MetricsCommandTree.interaction_check
+        started = interaction.extras.pop('started', None)
+        if started is not None and interaction.command is not None:
+            self.observe_command('slash', interaction.command.qualified_name,
+                                 time.perf_counter() - started, failed)
+
+    def time_sql(self, command, access, func, *args):
+        # Run func(*args) on a database thread, charging its time and
+        # statements to command
+        before = getattr(_statement_counts, 'value', 0)
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            seconds = time.perf_counter() - started
+            statements = getattr(_statement_counts, 'value', 0) - before
+            key = (command or 'background', access)
+            with self._lock:
+                histogram = self.sql_time.get(key)
+                if histogram is None:
+                    histogram = self.sql_time[key] = Histogram()
+                histogram.observe(seconds)
+                self.sql_statements[key] += statements
+
+    def count_request(self, method, route, status):
+        with self._lock:
+            self.rest_calls[(method, route, str(status))] += 1
+
+    def count_rate_limit(self, source):
+        with self._lock:
+            self.rate_limited[source] += 1
+
+    def summary(self, rows=METRICS_EMBED_ROWS):
+        # For /metrics: the slowest commands by p95 with their SQL cost, the
+        # busiest REST routes, the 429 counts and the total REST calls
+        with self._lock:
+            sql = {}
+            for (command, access), histogram in self.sql_time.items():
+                entry = sql.setdefault(command, [0, 0.0])
+                entry[0] += self.sql_statements[(command, access)]
+                entry[1] += histogram.sum
+            commands = sorted(
+                ((kind, name, histogram.count, histogram.quantile(0.5),
+                  histogram.quantile(0.95), self.failures[(kind, name)],
+                  *sql.get(name, (0, 0.0)))
+                 for (kind, name), histogram in self.latency.items()),
+                key=lambda row: (-row[4], -row[2]))[:rows]
+            routes, errors = Counter(), Counter()
+            for (method, route, status), count in self.rest_calls.items():
+                routes[(method, route)] += count
+                if status != 'ok':
+                    errors[(method, route)] += count
+            rest = [(method, route, count, errors[(method, route)])
+                    for (method, route), count in routes.most_common(rows)]
+            return commands, rest, dict(self.rate_limited), sum(
+                routes.values())
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+
+        def histogram(name, help_text, histograms, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in sorted(histograms.items()):
+                labels = _labels(**dict(zip(label_names, key)))
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + (float('inf'), ),
+                                        h.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(
+                        f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+        def counter(name, help_text, counts, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, count in sorted(counts.items()):
+                if not isinstance(key, tuple):
+                    key = (key, )
+                labels = _labels(**dict(zip(label_names, key)))
+                lines.append(f"{name}{{{labels}}} {count}")
+
+        with self._lock:
+            histogram("rematch_command_duration_seconds",
+                      "Time to handle a command or modal submit.",
+                      self.latency, ('kind', 'command'))
+            counter("rematch_command_failures_total",
+                    "Commands and modal submits that raised.", self.failures,
+                    ('kind', 'command'))
+            histogram("rematch_sql_duration_seconds",
+                      "Time spent in SQLite per read or write job.",
+                      self.sql_time, ('command', 'access'))
+            counter("rematch_sql_statements_total",
+                    "SQL statements run, per command.", self.sql_statements,
+                    ('command', 'access'))
+            counter("rematch_discord_requests_total",
+                    "Discord REST calls by route and status.", self.rest_calls,
+                    ('method', 'route', 'status'))
+            counter("rematch_discord_rate_limited_total",
+                    "Discord 429 responses that were retried.",
+                    self.rate_limited, ('source', ))
+            lines.append("# HELP rematch_start_time_seconds Process start.")
+            lines.append("# TYPE rematch_start_time_seconds gauge")
+            lines.append(f"rematch_start_time_seconds {self.started}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# discord.py retries 429s itself and only logs them. A 429 whose wait is
+# too long is raised instead of retried; its log line has no "Retrying in".
+class RateLimitLogCounter(logging.Filter):
+
+    def filter(self, record):
+        if (isinstance(record.msg, str) and record.msg.startswith(
+            ('We are being rate limited', 'Global rate limit has been hit'))
+                and 'Retrying in' in record.msg):
+            metrics.count_rate_limit('discord.py')
+        return True
+
+
+logging.getLogger('discord.http').addFilter(RateLimitLogCounter())
+
+# Queries of every league run on these threads, so their number doesn't
+# grow with the number of leagues open
+read_executor = ThreadPoolExecutor(max_workers=DB_READ_POOL_SIZE,
+                                   thread_name_prefix='league-db-read')
 
 
 # Data storage
 class LeagueData:
 
-    def __init__(self):
-        self.conn = sqlite3.connect('league_data.db')
+    def __init__(self, path='league_data.db'):
+        self.path = path
+        # The write connection is only used from the startup code and, once
+        # the bot is running, from the writer thread below. Transactions are
+        # managed explicitly by the writer.
+        self.conn = sqlite3.connect(path,
+                                    check_same_thread=False,
+                                    isolation_level=None,
+                                    factory=CountingConnection)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.cursor = self.conn.cursor()
+        # Queries run on read-only connections, so they never wait behind
+        # writes. A reader thread takes an idle one of this league's
+        # connections, or opens one, and puts it back afterwards.
+        self._read_conns = queue.SimpleQueue()
+        self.closed = False
+        # Writes are queued for a single writer thread
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop,
+                                        name='league-db-write',
+                                        daemon=True)
         self.teams = {}  # Initialize teams dictionary
-        self.player_stats = {}  # Initialize player_stats dictionary
+        self.stats_totals = Counter()  # Sums of the player_stats columns
         self.team_captains = {}  # Initialize team_captains dictionary
         self.player_teams = {}  # Initialize player_teams dictionary
+        self.standings = StandingsTable()
+        self.champions_league_standings = StandingsTable()
+        self.announcement_channel_id = None
+        # Bumped on every change to a part of the league, so cached embeds
+        # built from it can tell they are stale
+        self.versions = Counter()
+        # Rows changed since the last save_data, per table: key -> True for
+        # an upsert, False for a delete
+        self._changes = {'teams': {}, 'team_captains': {}, 'team_players': {}}
+        # The same, for batches save_data is writing right now
+        self._saving = []
+        # Last change_log entry and change counts this process has seen, and
+        # the data_version of the write connection when the writer last
+        # looked
+        self._change_log_seen = 0
+        self._change_counts_seen = {}
+        self._change_log_trimmed = 0
+        self._data_version = None
         self.create_tables()
+        self._writer.start()
 
     def create_tables(self):
 
@@ -39,7 +942,6 @@ class LeagueData:
         CREATE TABLE IF NOT EXISTS teams (
             team_name TEXT PRIMARY KEY,
             captain_id INTEGER,
-            players TEXT,
             division TEXT
         )
         ''')
@@ -48,35 +950,60 @@ class LeagueData:
         CREATE TABLE IF NOT EXISTS champions_league_teams (
             team_name TEXT PRIMARY KEY,
             captain_id INTEGER,
-            players TEXT,
             division TEXT
         )
         ''')
 
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS player_stats {AGGREGATE_TABLES['player_stats']}"
+        )
+        # Per-player stats of every reported match
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS player_stats (
-            player_id INTEGER PRIMARY KEY,
-            goals INTEGER,
-            assists INTEGER,
-            saves INTEGER
-            champions_league_goals INTEGER DEFAULT 0,
-            champions_league_assists INTEGER DEFAULT 0,
-            champions_league_saves INTEGER DEFAULT 0
+        CREATE TABLE IF NOT EXISTS player_match_stats (
+            match_id INTEGER NOT NULL,
+            competition TEXT NOT NULL,
+            player_id INTEGER NOT NULL,
+            team TEXT NOT NULL,
+            goals INTEGER DEFAULT 0,
+            assists INTEGER DEFAULT 0,
+            saves INTEGER DEFAULT 0,
+            PRIMARY KEY (match_id, player_id),
+            FOREIGN KEY (match_id) REFERENCES scheduled_matches(match_id)
         )
         ''')
         self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_player_match_stats_player
+        ON player_match_stats (player_id, match_id DESC)
+        ''')
+        self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS team_captains (
             captain_id INTEGER PRIMARY KEY,
             team_name TEXT
         )
         ''')
+        # Rosters: one row per player, a player belongs to at most one team
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS player_teams (
-            player_id INTEGER PRIMARY KEY,
-            team_name TEXT
+        CREATE TABLE IF NOT EXISTS team_players (
+            team_name TEXT NOT NULL,
+            player_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (team_name, player_id),
+            FOREIGN KEY (team_name) REFERENCES teams(team_name)
         )
         ''')
         self.cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_team_players_player
+        ON team_players (player_id)
+        ''')
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_team_players_position
+        ON team_players (team_name, position)
+        ''')
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_teams_division
+        ON teams (division, team_name)
+        ''')
+        self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS scheduled_matches (
             match_id INTEGER PRIMARY KEY AUTOINCREMENT,
             team1_name TEXT,
@@ -87,6 +1014,11 @@ class LeagueData:
             FOREIGN KEY (team2_name) REFERENCES teams(team_name)
         )
         ''')
+        # Covers list_matches: filter on status, read in schedule order
+        self.cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_matches_status
+        ON scheduled_matches (status, scheduled_time, match_id, team1_name, team2_name)
+        ''')
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS match_results (
             match_id INTEGER PRIMARY KEY,
@@ -113,109 +1045,1114 @@ class LeagueData:
         )
         ''')
 
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS standings {AGGREGATE_TABLES['standings']}"
+        )
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS champions_league_standings {AGGREGATE_TABLES['champions_league_standings']}"
+        )
+        # Career stats from before per-match stats were kept that the match
+        # history can't account for; /rebuild_stats starts from these
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS legacy_player_stats {AGGREGATE_TABLES['player_stats']}"
+        )
+        # One-time data migrations that have been applied
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS standings (
-            team_name TEXT PRIMARY KEY,
-            wins INTEGER DEFAULT 0,
-            losses INTEGER DEFAULT 0,
-            draws INTEGER DEFAULT 0,
-            FOREIGN KEY (team_name) REFERENCES teams(team_name)
+        CREATE TABLE IF NOT EXISTS migrations (
+            name TEXT PRIMARY KEY
         )
         ''')
+        # First match of the current season per competition; a rebuild only
+        # counts results from there on
         self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS champions_league_standings (
-            team_name TEXT PRIMARY KEY,
-            wins INTEGER DEFAULT 0,
-            losses INTEGER DEFAULT 0,
-            draws INTEGER DEFAULT 0,
-            FOREIGN KEY (team_name) REFERENCES champions_league_teams(team_name)
+        CREATE TABLE IF NOT EXISTS season_starts (
+            competition TEXT PRIMARY KEY,
+            first_match_id INTEGER NOT NULL
+        )
+        ''')
+        # Changes to the tables in CHANGE_LOG_TABLES, written by triggers so
+        # that other processes and admin scripts are tracked as well: keyed
+        # tables log every changed key, the others only count their changes
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            key
         )
         ''')
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_counts (
+            table_name TEXT PRIMARY KEY,
+            changes INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''')
+        # Fingerprint of the slash commands last synced per scope ('global'
+        # or a guild id)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS command_sync (
+            scope TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL
+        )
+        ''')
+        # Per-league settings, such as the announcement channel
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS league_settings (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''')
+
+        # Older databases were created without the champions_league_goals
+        # column (missing comma in the player_stats definition)
+        self._add_missing_columns('player_stats',
+                                  ['champions_league_goals INTEGER DEFAULT 0'])
+        # ... and without the materialized standings columns, which are
+        # derived from the recorded results when they are added
+        standings_columns = [
+            'goals_for INTEGER DEFAULT 0', 'goals_against INTEGER DEFAULT 0',
+            'points INTEGER DEFAULT 0'
+        ]
+        for table, results_table in (('standings', 'match_results'),
+                                     ('champions_league_standings',
+                                      'champions_league_match_results')):
+            added = self._add_missing_columns(table, standings_columns)
+            self._backfill_standings(table, results_table, added)
+        # Standings are ranked in memory (StandingsTable)
+        self.cursor.execute("DROP INDEX IF EXISTS idx_standings_rank")
+        self.cursor.execute(
+            "DROP INDEX IF EXISTS idx_champions_league_standings_rank")
+        self.create_leaderboard_indexes(self.cursor)
+        self.create_change_triggers(self.cursor)
+        self.migrate_rosters()
+        self.migrate_match_stats()
         self.conn.commit()
 
-    def save_data(self):
-        # Clear existing data
-        self.cursor.execute("DELETE FROM teams")
-        self.cursor.execute("DELETE FROM player_stats")
-        self.cursor.execute("DELETE FROM team_captains")
-        self.cursor.execute("DELETE FROM player_teams")
-
-        # Insert teams
-        for team_name, team_data in self.teams.items():
-            self.cursor.execute("INSERT INTO teams VALUES (?, ?, ?, ?)",
-                                (team_name, team_data['captain_id'], ','.join(
-                                    map(str, team_data['players'])),
-                                 team_data.get('division', '')))
-
-        # Insert player stats
-        for player_id, stats in self.player_stats.items():
+    @staticmethod
+    def create_leaderboard_indexes(cursor):
+        # Leaderboard indexes, one per ranking expression
+        for (competition, stat), expression in LEADERBOARD_EXPRESSIONS.items():
+            cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_player_stats_{competition}_{stat}
+            ON player_stats (({expression}) DESC)
+            ''')
+
+    @staticmethod
+    def create_change_triggers(cursor):
+        for table, key in CHANGE_LOG_TABLES.items():
+            if key is None:
+                # One counter row per table, so a result touching a dozen
+                # player_stats rows adds no log entries
+                cursor.execute(
+                    "INSERT OR IGNORE INTO change_counts (table_name) VALUES (?)",
+                    (table, ))
+                for event in ('insert', 'update', 'delete'):
+                    cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS log_{table}_{event} AFTER {event.upper()} ON {table}
+                    BEGIN
+                        UPDATE change_counts SET changes = changes + 1 WHERE table_name = '{table}';
+                    END''')
+                continue
+            old, new = f"OLD.{key}", f"NEW.{key}"
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS log_{table}_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, key) VALUES ('{table}', {new});
+            END''')
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS log_{table}_update AFTER UPDATE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, key)
+                SELECT '{table}', {old} UNION SELECT '{table}', {new};
+            END''')
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS log_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, key) VALUES ('{table}', {old});
+            END''')
+
+    def _add_missing_columns(self, table, column_definitions):
+        # Returns the names of the columns added
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in self.cursor.fetchall()]
+        added = []
+        for definition in column_definitions:
+            name = definition.split()[0]
+            if name not in columns:
+                self.cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {definition}")
+                added.append(name)
+        return added
+
+    def _backfill_standings(self, table, results_table, added):
+        # Points follow from the stored record
+        if 'points' in added:
             self.cursor.execute(
-                "INSERT INTO player_stats (player_id, goals, assists, saves) VALUES (?, ?, ?, ?)",
-                (player_id, stats['goals'], stats['assists'], stats['saves']))
+                f"UPDATE {table} SET points = COALESCE(wins, 0) * ? + COALESCE(draws, 0) * ?",
+                (POINTS_FOR_WIN, POINTS_FOR_DRAW))
+        # Goals come from every recorded result, as older databases have
+        # no season marker; /rebuild_stats recounts the current season
+        if 'goals_for' in added or 'goals_against' in added:
+            self.cursor.execute(f'''
+            UPDATE {table} SET
+                goals_for = COALESCE((
+                    SELECT SUM(CASE WHEN m.team1_name = {table}.team_name
+                                    THEN r.team1_score ELSE r.team2_score END)
+                    FROM {results_table} r
+                    JOIN scheduled_matches m ON m.match_id = r.match_id
+                    WHERE {table}.team_name IN (m.team1_name, m.team2_name)), 0),
+                goals_against = COALESCE((
+                    SELECT SUM(CASE WHEN m.team1_name = {table}.team_name
+                                    THEN r.team2_score ELSE r.team1_score END)
+                    FROM {results_table} r
+                    JOIN scheduled_matches m ON m.match_id = r.match_id
+                    WHERE {table}.team_name IN (m.team1_name, m.team2_name)), 0)
+            ''')
+            log.info(
+                "Backfilled goals in %s from all recorded results; run "
+                "/rebuild_stats if standings were reset since", table)
+
+    def migrate_rosters(self):
+        # Older databases kept rosters as a comma-separated players column
+        # on teams/champions_league_teams and a player_teams table. Move them
+        # into team_players once, then clear the legacy data.
+        self.cursor.execute("PRAGMA table_info(teams)")
+        if 'players' not in [row[1] for row in self.cursor.fetchall()]:
+            return
 
-        # Insert team captains
-        for captain_id, team_name in self.team_captains.items():
-            self.cursor.execute("INSERT INTO team_captains VALUES (?, ?)",
-                                (captain_id, team_name))
+        self.cursor.execute("BEGIN")
+        self.cursor.execute(
+            "SELECT team_name, players FROM teams WHERE players IS NOT NULL")
+        rows = []
+        for team_name, players_str in self.cursor.fetchall():
+            for position, player_id in enumerate(
+                    p for p in players_str.split(',') if p):
+                rows.append((team_name, int(player_id), position))
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO team_players (team_name, player_id, position) VALUES (?, ?, ?)",
+            rows)
+        self.cursor.execute("UPDATE teams SET players = NULL")
+        self.cursor.execute("PRAGMA table_info(champions_league_teams)")
+        if 'players' in [row[1] for row in self.cursor.fetchall()]:
+            self.cursor.execute(
+                "UPDATE champions_league_teams SET players = NULL")
+        self.cursor.execute("DROP TABLE IF EXISTS player_teams")
+        self.cursor.execute("COMMIT")
+
+    def migrate_match_stats(self):
+        # Results reported before player_match_stats existed only kept the
+        # raw "goals/assists/saves" lines, in roster order at the time. There
+        # is no roster history, so a team's lines are only attributed when
+        # their count still matches its roster; otherwise the roster has
+        # changed since and that side is skipped. Whatever player_stats holds
+        # beyond the attributed history is kept in legacy_player_stats, so a
+        # rebuild doesn't lose it. Runs once.
+        if self.cursor.execute("SELECT 1 FROM migrations WHERE name = ?",
+                               ('match_stats', )).fetchone():
+            return
+        self.cursor.execute("BEGIN")
+        rosters = {}
+        for team_name, player_id in self.cursor.execute(
+                "SELECT team_name, player_id FROM team_players ORDER BY team_name, position"
+        ):
+            rosters.setdefault(team_name, []).append(player_id)
+        rows, skipped = [], 0
+        for competition, results_table in (('league', 'match_results'),
+                                           ('champions_league',
+                                            'champions_league_match_results')):
+            self.cursor.execute(f"""
+                SELECT r.match_id, m.team1_name, m.team2_name, r.team1_goals, r.team2_goals
+                FROM {results_table} r
+                JOIN scheduled_matches m ON m.match_id = r.match_id
+            """)
+            for match_id, team1_name, team2_name, team1_text, team2_text in self.cursor.fetchall(
+            ):
+                for team_name, text in ((team1_name, team1_text),
+                                        (team2_name, team2_text)):
+                    try:
+                        stats = parse_stats_lines(text or '')
+                    except ValueError:
+                        continue
+                    roster = rosters.get(team_name, [])
+                    if len(stats) != len(roster):
+                        skipped += 1
+                        continue
+                    rows += [(match_id, competition, player_id, team_name,
+                              goals, assists, saves)
+                             for player_id, (goals, assists,
+                                             saves) in zip(roster, stats)]
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO player_match_stats (match_id, competition, player_id, team, goals, assists, saves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows)
+        self.cursor.execute("""
+            INSERT OR REPLACE INTO legacy_player_stats
+            SELECT * FROM (
+                SELECT s.player_id,
+                    MAX(COALESCE(s.goals, 0) - COALESCE(h.goals, 0), 0) AS goals,
+                    MAX(COALESCE(s.assists, 0) - COALESCE(h.assists, 0), 0) AS assists,
+                    MAX(COALESCE(s.saves, 0) - COALESCE(h.saves, 0), 0) AS saves,
+                    MAX(COALESCE(s.champions_league_goals, 0) - COALESCE(h.cl_goals, 0), 0) AS cl_goals,
+                    MAX(COALESCE(s.champions_league_assists, 0) - COALESCE(h.cl_assists, 0), 0) AS cl_assists,
+                    MAX(COALESCE(s.champions_league_saves, 0) - COALESCE(h.cl_saves, 0), 0) AS cl_saves
+                FROM player_stats s
+                LEFT JOIN (
+                    SELECT player_id,
+                        SUM(CASE WHEN competition = 'league' THEN goals ELSE 0 END) AS goals,
+                        SUM(CASE WHEN competition = 'league' THEN assists ELSE 0 END) AS assists,
+                        SUM(CASE WHEN competition = 'league' THEN saves ELSE 0 END) AS saves,
+                        SUM(CASE WHEN competition = 'champions_league' THEN goals ELSE 0 END) AS cl_goals,
+                        SUM(CASE WHEN competition = 'champions_league' THEN assists ELSE 0 END) AS cl_assists,
+                        SUM(CASE WHEN competition = 'champions_league' THEN saves ELSE 0 END) AS cl_saves
+                    FROM player_match_stats GROUP BY player_id
+                ) h ON h.player_id = s.player_id
+            )
+            WHERE goals + assists + saves + cl_goals + cl_assists + cl_saves > 0
+        """)
+        self.cursor.execute("INSERT INTO migrations (name) VALUES (?)",
+                            ('match_stats', ))
+        self.cursor.execute("COMMIT")
+        if skipped:
+            log.info(
+                "Skipped the per-player stats of %d results whose team "
+                "roster has changed since", skipped)
+
+    def check_query_plans(self):
+        # Return (query name, plan step) for every hot query that reads a
+        # whole table, directly or by walking all of one of its indexes,
+        # instead of searching an index
+        full_scans = []
+        for name, (query, params) in HOT_QUERIES.items():
+            self.cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            for row in self.cursor.fetchall():
+                detail = row[-1]
+                if detail.startswith('SCAN') and detail != 'SCAN CONSTANT ROW':
+                    full_scans.append((name, detail))
+        return full_scans
+
+    # Which cached views each table feeds
+    TABLE_VERSIONS = {
+        'teams': ('teams', 'standings'),
+        'team_captains': ('teams', ),
+        'team_players': ('teams', )
+    }
 
-        # Insert player teams
-        for player_id, team_name in self.player_teams.items():
-            self.cursor.execute("INSERT INTO player_teams VALUES (?, ?)",
-                                (player_id, team_name))
+    def bump(self, *parts):
+        for part in parts:
+            self.versions[part] += 1
+
+    def _track(self, table, key, deleted=False):
+        self._changes[table][key] = not deleted
+
+    # Mutations: update the in-memory dictionaries and record the rows that
+    # save_data has to write; the cached views are only marked stale once
+    # those rows are committed
+    def add_team(self, team_name, captain_id):
+        self.teams[team_name] = Team(captain_id, [captain_id])
+        self.team_captains[captain_id] = team_name
+        self.player_teams[captain_id] = team_name
+        self.standings.add_team(team_name)
+        self._track('teams', team_name)
+        self._track('team_captains', captain_id)
+        self._track('team_players', team_name)
+
+    def add_player(self, team_name, player_id):
+        self.teams[team_name].players.append(player_id)
+        self.player_teams[player_id] = team_name
+        self._track('team_players', team_name)
+
+    def remove_player(self, team_name, player_id):
+        team = self.teams[team_name]
+        team.players.remove(player_id)
+        del self.player_teams[player_id]
+        self._track('team_players', team_name)
+        if team.captain_id == player_id:
+            self.team_captains.pop(player_id, None)
+            self._track('team_captains', player_id, deleted=True)
+
+    def delete_team(self, team_name):
+        team = self.teams.pop(team_name)
+        self.standings.remove_team(team_name)
+        self._track('teams', team_name, deleted=True)
+        self._track('team_players', team_name, deleted=True)
+        for player_id in team.players:
+            if self.player_teams.get(player_id) == team_name:
+                del self.player_teams[player_id]
+        captain_id = team.captain_id
+        if self.team_captains.get(captain_id) == team_name:
+            del self.team_captains[captain_id]
+            self._track('team_captains', captain_id, deleted=True)
+
+    def set_captain(self, team_name, captain_id):
+        team = self.teams[team_name]
+        old_captain_id = team.captain_id
+        if self.team_captains.get(old_captain_id) == team_name:
+            del self.team_captains[old_captain_id]
+            self._track('team_captains', old_captain_id, deleted=True)
+        team.captain_id = captain_id
+        self.team_captains[captain_id] = team_name
+        self._track('teams', team_name)
+        self._track('team_captains', captain_id)
+
+    def set_division(self, team_name, division):
+        self.teams[team_name].division = division
+        self.standings.set_division(team_name, division)
+        self._track('teams', team_name)
+
+    def _collect_changes(self):
+        # Snapshot the changed rows on the event loop so the database thread
+        # never reads the dictionaries while commands are mutating them
+        changes = self._changes
+        team_rows = []
+        for team_name, upsert in changes['teams'].items():
+            if upsert:
+                team = self.teams[team_name]
+                team_rows.append((team_name, team.captain_id, team.division))
+        captain_rows = [
+            (captain_id, self.team_captains[captain_id])
+            for captain_id, upsert in changes['team_captains'].items()
+            if upsert
+        ]
+        # Changed rosters are rewritten whole, positions follow list order
+        roster_rows = [
+            (team_name, player_id, position)
+            for team_name in changes['team_players'] if team_name in self.teams
+            for position, player_id in enumerate(self.teams[team_name].players)
+        ]
 
-        self.conn.commit()
+        def deleted(table):
+            return [(key, ) for key, upsert in changes[table].items()
+                    if not upsert]
+
+        batch = {
+            'pending': {
+                table: dict(table_changes)
+                for table, table_changes in changes.items()
+            },
+            'deleted_teams': deleted('teams'),
+            'deleted_team_captains': deleted('team_captains'),
+            'rosters':
+            [(team_name, ) for team_name in changes['team_players']],
+            'teams': team_rows,
+            'team_captains': captain_rows,
+            'team_players': roster_rows
+        }
+        for table_changes in changes.values():
+            table_changes.clear()
+        return batch
+
+    def _write_changes(self, cursor, batch):
+        cursor.executemany("DELETE FROM teams WHERE team_name = ?",
+                           batch['deleted_teams'])
+        cursor.executemany("DELETE FROM standings WHERE team_name = ?",
+                           batch['deleted_teams'])
+        cursor.executemany("DELETE FROM team_captains WHERE captain_id = ?",
+                           batch['deleted_team_captains'])
+        cursor.executemany("DELETE FROM team_players WHERE team_name = ?",
+                           batch['rosters'])
+
+        cursor.executemany(
+            """INSERT INTO teams (team_name, captain_id, division) VALUES (?, ?, ?)
+            ON CONFLICT(team_name) DO UPDATE SET captain_id = excluded.captain_id, division = excluded.division""",
+            batch['teams'])
+        cursor.executemany(
+            "INSERT OR IGNORE INTO standings (team_name) VALUES (?)",
+            [(row[0], ) for row in batch['teams']])
+        cursor.executemany(
+            """INSERT INTO team_captains (captain_id, team_name) VALUES (?, ?)
+            ON CONFLICT(captain_id) DO UPDATE SET team_name = excluded.team_name""",
+            batch['team_captains'])
+        cursor.executemany(
+            "INSERT INTO team_players (team_name, player_id, position) VALUES (?, ?, ?)",
+            batch['team_players'])
+
+    async def save_data(self):
+        # Write only the rows that changed since the last save, in a single
+        # transaction on the database thread
+        batch = self._collect_changes()
+        self._saving.append(batch['pending'])
+        try:
+            await self.transaction(self._write_changes, batch)
+        except Exception:
+            # Keep the failed rows pending, unless they changed again since
+            for table, table_changes in batch['pending'].items():
+                for key, upsert in table_changes.items():
+                    self._changes[table].setdefault(key, upsert)
+            raise
+        finally:
+            self._saving.remove(batch['pending'])
+        # Only now: a view read from the database while the write was queued
+        # still shows the old rows and must not be cached as current
+        for table, table_changes in batch['pending'].items():
+            if table_changes:
+                self.bump(*self.TABLE_VERSIONS[table])
+
+    # Match results: run on the writer thread as one transaction
+    def record_match_result(self, cursor, match_id, team1_name, team2_name,
+                            score1, score2, team1_players, team1_stats,
+                            team2_players, team2_stats, is_champions_league):
+        # Claim the match first so a second submission of the same match_id
+        # is rejected instead of counted twice
+        cursor.execute(
+            "UPDATE scheduled_matches SET status = 'completed' WHERE match_id = ? AND status IS NOT 'completed'",
+            (match_id, ))
+        if cursor.rowcount == 0:
+            if cursor.execute(
+                    "SELECT 1 FROM scheduled_matches WHERE match_id = ?",
+                (match_id, )).fetchone() is None:
+                raise MatchNotFound(f"Match #{match_id} does not exist!")
+            raise MatchAlreadyReported(
+                f"Match #{match_id} has already been reported!")
+
+        # Update player stats
+        player_rows = self.update_player_stats(cursor, team1_players,
+                                               team1_stats, team2_players,
+                                               team2_stats,
+                                               is_champions_league)
+
+        # Save match result to appropriate table
+        results_table = ("champions_league_match_results"
+                         if is_champions_league else "match_results")
+        cursor.execute(
+            f"""INSERT INTO {results_table} (match_id, team1_score, team2_score, team1_saves, team2_saves)
+            VALUES (?, ?, ?, ?, ?)""",
+            (match_id, score1, score2, sum(stats[2] for stats in team1_stats),
+             sum(stats[2] for stats in team2_stats)))
+
+        # Save each player's line for this match
+        competition = "champions_league" if is_champions_league else "league"
+        cursor.executemany(
+            "INSERT INTO player_match_stats (match_id, competition, player_id, team, goals, assists, saves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(match_id, competition, player_id, team_name, goals, assists,
+              saves)
+             for team_name, players, stats in ((team1_name, team1_players,
+                                                team1_stats),
+                                               (team2_name, team2_players,
+                                                team2_stats))
+             for player_id, (goals, assists, saves) in zip(players, stats)])
+
+        # Update standings for the league the match was played in
+        if not is_champions_league:
+            self.update_regular_league_standings(cursor, team1_name,
+                                                 team2_name, score1, score2)
+        else:
+            self.update_champions_league_standings(cursor, team1_name,
+                                                   team2_name, score1, score2)
+        return player_rows
+
+    def record_match_results(self, cursor, results):
+        # A whole batch of record_match_result argument tuples in one
+        # transaction; if any of them fails none is recorded
+        return [
+            self.record_match_result(cursor, *result) for result in results
+        ]
 
-    def load_data(self):
-        # Load teams
-        self.cursor.execute("SELECT * FROM teams")
-        for row in self.cursor.fetchall():
-            team_name, captain_id, players_str, division = row
-            self.teams[team_name] = {
-                'captain_id': captain_id,
-                'players': list(map(int, players_str.split(','))),
-                'division': division
+    def fetch_matches(self, conn, match_ids):
+        # {match_id: (team1_name, team2_name, status)}
+        match_ids = list(match_ids)
+        matches = {}
+        for start in range(0, len(match_ids), IMPORT_LOOKUP_CHUNK):
+            chunk = match_ids[start:start + IMPORT_LOOKUP_CHUNK]
+            for match_id, team1_name, team2_name, status in conn.execute(
+                    f"SELECT match_id, team1_name, team2_name, status FROM scheduled_matches WHERE match_id IN ({', '.join('?' * len(chunk))})",
+                    chunk):
+                matches[match_id] = (team1_name, team2_name, status)
+        return matches
+
+    def update_player_stats(self, cursor, team1_players, team1_stats,
+                            team2_players, team2_stats, is_champions_league):
+        # Stats lines map to roster order; players without a line are skipped
+        rows = [(player_id, goals, assists, saves)
+                for player_id, (goals, assists,
+                                saves) in zip(team1_players, team1_stats)]
+        rows += [(player_id, goals, assists, saves)
+                 for player_id, (goals, assists,
+                                 saves) in zip(team2_players, team2_stats)]
+
+        if is_champions_league:
+            cursor.executemany(
+                """INSERT INTO player_stats (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves)
+                VALUES (?1, 0, 0, 0, ?2, ?3, ?4)
+                ON CONFLICT(player_id) DO UPDATE SET champions_league_goals = champions_league_goals + ?2, champions_league_assists = champions_league_assists + ?3, champions_league_saves = champions_league_saves + ?4""",
+                rows)
+        else:
+            cursor.executemany(
+                """INSERT INTO player_stats (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves)
+                VALUES (?1, ?2, ?3, ?4, 0, 0, 0)
+                ON CONFLICT(player_id) DO UPDATE SET goals = goals + ?2, assists = assists + ?3, saves = saves + ?4""",
+                rows)
+        return rows
+
+    @staticmethod
+    def _standings_deltas(team1_name, team2_name, score1, score2):
+        # (wins, losses, draws, goals_for, goals_against, points, team_name)
+        # increments for both teams
+        deltas = []
+        for team_name, scored, conceded in ((team1_name, score1, score2),
+                                            (team2_name, score2, score1)):
+            if scored > conceded:
+                deltas.append(
+                    (1, 0, 0, scored, conceded, POINTS_FOR_WIN, team_name))
+            elif scored < conceded:
+                deltas.append((0, 1, 0, scored, conceded, 0, team_name))
+            else:
+                deltas.append(
+                    (0, 0, 1, scored, conceded, POINTS_FOR_DRAW, team_name))
+        return deltas
+
+    def update_regular_league_standings(self, cursor, team1_name, team2_name,
+                                        score1, score2):
+        # Make sure teams exist in standings
+        cursor.executemany(
+            "INSERT OR IGNORE INTO standings (team_name) VALUES (?)",
+            [(team1_name, ), (team2_name, )])
+        cursor.executemany(
+            """UPDATE standings SET wins = wins + ?, losses = losses + ?, draws = draws + ?,
+            goals_for = goals_for + ?, goals_against = goals_against + ?, points = points + ?
+            WHERE team_name = ?""",
+            self._standings_deltas(team1_name, team2_name, score1, score2))
+
+    def update_champions_league_standings(self, cursor, team1_name, team2_name,
+                                          score1, score2):
+        # Make sure teams exist in champions_league_standings
+        cursor.executemany(
+            "INSERT OR IGNORE INTO champions_league_standings (team_name) VALUES (?)",
+            [(team1_name, ), (team2_name, )])
+        cursor.executemany(
+            """UPDATE champions_league_standings SET wins = wins + ?, losses = losses + ?, draws = draws + ?,
+            goals_for = goals_for + ?, goals_against = goals_against + ?, points = points + ?
+            WHERE team_name = ?""",
+            self._standings_deltas(team1_name, team2_name, score1, score2))
+
+    def apply_match_result(self, player_rows, team1_name, team2_name, score1,
+                           score2, is_champions_league):
+        # Mirror a committed result in the in-memory standings and stats
+        if is_champions_league:
+            self.champions_league_standings.record_result(
+                team1_name, team2_name, score1, score2)
+        else:
+            self.standings.record_result(team1_name, team2_name, score1,
+                                         score2)
+        self.apply_player_stats(player_rows, is_champions_league)
+        self.bump('standings', 'stats', 'matches')
+
+    def apply_player_stats(self, rows, is_champions_league):
+        # Mirror committed stat increments in the in-memory totals
+        prefix = 'champions_league_' if is_champions_league else ''
+        for _, goals, assists, saves in rows:
+            self.stats_totals[prefix + 'goals'] += goals
+            self.stats_totals[prefix + 'assists'] += assists
+            self.stats_totals[prefix + 'saves'] += saves
+
+    def rebuild_aggregates(self, cursor):
+        # Recompute player_stats and both standings tables by replaying the
+        # match history in one streaming pass. The results go to shadow
+        # tables that replace the live ones at the end of this transaction,
+        # so readers see either the old or the new aggregates. Returns the
+        # number of players and the rows for load_aggregates.
+        for table, columns in AGGREGATE_TABLES.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {table}_rebuild")
+            cursor.execute(f"CREATE TABLE {table}_rebuild {columns}")
+
+        # Career player stats, every competition and season, on top of what
+        # was recorded before per-match stats were kept
+        totals = {
+            row[0]: list(row)
+            for row in cursor.execute(
+                "SELECT player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves FROM legacy_player_stats"
+            )
+        }
+        cursor.execute(
+            "SELECT player_id, competition, goals, assists, saves FROM player_match_stats"
+        )
+        for rows in iter(lambda: cursor.fetchmany(REBUILD_BATCH_SIZE), []):
+            for player_id, competition, goals, assists, saves in rows:
+                row = totals.get(player_id)
+                if row is None:
+                    row = totals[player_id] = [player_id, 0, 0, 0, 0, 0, 0]
+                offset = 4 if competition == 'champions_league' else 1
+                row[offset] += goals
+                row[offset + 1] += assists
+                row[offset + 2] += saves
+        cursor.executemany(
+            "INSERT INTO player_stats_rebuild (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            totals.values())
+
+        # Standings of the current season for the teams still entered
+        for competition, teams_table, results_table, standings_table in (
+            ('league', 'teams', 'match_results', 'standings'),
+            ('champions_league', 'champions_league_teams',
+             'champions_league_match_results', 'champions_league_standings')):
+            table_rows = {
+                team_name: [0, 0, 0, 0, 0, 0, team_name]
+                for team_name, in cursor.execute(
+                    f"SELECT team_name FROM {teams_table}").fetchall()
             }
+            season_start = cursor.execute(
+                "SELECT first_match_id FROM season_starts WHERE competition = ?",
+                (competition, )).fetchone()
+            cursor.execute(
+                f"""SELECT m.team1_name, m.team2_name, r.team1_score, r.team2_score
+                FROM {results_table} r JOIN scheduled_matches m ON m.match_id = r.match_id
+                WHERE r.match_id >= ?""",
+                (season_start[0] if season_start else 0, ))
+            for rows in iter(lambda: cursor.fetchmany(REBUILD_BATCH_SIZE), []):
+                for team1_name, team2_name, score1, score2 in rows:
+                    for delta in self._standings_deltas(
+                            team1_name, team2_name, score1, score2):
+                        row = table_rows.get(delta[6])
+                        if row is not None:
+                            for i in range(6):
+                                row[i] += delta[i]
+            cursor.executemany(
+                f"INSERT INTO {standings_table}_rebuild (wins, losses, draws, goals_for, goals_against, points, team_name) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                table_rows.values())
+
+        # Swap the shadow tables in. Their triggers went with the old
+        # tables, and the swap itself is logged so other processes reload.
+        for table in AGGREGATE_TABLES:
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+        self.create_leaderboard_indexes(cursor)
+        self.create_change_triggers(cursor)
+        cursor.executemany(
+            "UPDATE change_counts SET changes = changes + 1 WHERE table_name = ?",
+            [(table, ) for table in AGGREGATE_TABLES])
+
+        return len(totals), (
+            cursor.execute(PLAYER_STATS_TOTALS_QUERY).fetchone(),
+            cursor.execute(STANDINGS_LOAD_QUERY).fetchall(),
+            cursor.execute(CHAMPIONS_LEAGUE_STANDINGS_LOAD_QUERY).fetchall())
+
+    def start_season(self, cursor, competition):
+        # Results of matches scheduled from now on belong to the new season
+        cursor.execute(
+            """INSERT OR REPLACE INTO season_starts (competition, first_match_id)
+            SELECT ?, COALESCE(MAX(match_id), 0) + 1 FROM scheduled_matches""",
+            (competition, ))
+
+    # Async data access: nothing here runs sqlite on the event loop
+    def _run_read(self, command, func, args):
+        try:
+            conn = self._read_conns.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro",
+                                   uri=True,
+                                   check_same_thread=False,
+                                   factory=CountingConnection)
+            conn.execute("PRAGMA busy_timeout=5000")
+        try:
+            return metrics.time_sql(command, 'read', func, conn, *args)
+        finally:
+            self._read_conns.put(conn)
+
+    async def read(self, func, *args):
+        # Run func(connection, *args) on one of the reader threads
+        if self.closed:
+            raise RuntimeError(f"{self.path} is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(read_executor, self._run_read,
+                                          current_command.get(), func, args)
+
+    async def fetchone(self, query, params=()):
+        return await self.read(
+            lambda conn: conn.execute(query, params).fetchone())
+
+    async def fetchall(self, query, params=()):
+        return await self.read(
+            lambda conn: conn.execute(query, params).fetchall())
+
+    async def transaction(self, func, *args):
+        # Queue func(cursor, *args) for the writer thread; it becomes durable
+        # together with the other writes committed in the same group. If it
+        # raises, only its own changes are rolled back.
+        if self.closed:
+            raise RuntimeError(f"{self.path} is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        command = current_command.get()
+        self._write_queue.put((lambda cursor, *args: metrics.time_sql(
+            command, 'write', func, cursor, *args), args, loop, future))
+        return await future
+
+    async def execute(self, query, params=()):
+        return await self.transaction(
+            lambda cursor: cursor.execute(query, params).rowcount)
+
+    async def sync(self):
+        # Pick up what other processes committed since the last write or
+        # sync. Costs one PRAGMA when nothing changed.
+        if self.closed:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._write_queue.put((None, (), loop, future))
+        await future
+
+    def _writer_loop(self):
+        while True:
+            job = self._write_queue.get()
+            if job is None:
+                return
+            # Group every write that queued up while the last commit was
+            # running into this one
+            jobs = [job]
+            while len(jobs) < DB_MAX_WRITE_BATCH:
+                try:
+                    job = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._write_queue.put(None)
+                    break
+                jobs.append(job)
+            self._run_write_batch(jobs)
+
+    def _run_write_batch(self, jobs):
+        outcomes = []
+        refreshed = None
+        cursor = self.conn.cursor()
+        # data_version only moves when another connection commits
+        data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+        if (data_version == self._data_version
+                and all(func is None for func, *_ in jobs)):
+            for func, args, loop, future in jobs:
+                loop.call_soon_threadsafe(_resolve_future, future, None, None)
+            return
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            # No other process can commit while this transaction holds the
+            # write lock, so change_log entries after the last one seen and
+            # up to here are theirs, and the ones added below are ours
+            changed = self._foreign_changes(cursor)
+            for func, args, loop, future in jobs:
+                if func is None:
+                    outcomes.append((None, None))
+                    continue
+                cursor.execute("SAVEPOINT job")
+                try:
+                    result = func(cursor, *args)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO job")
+                    outcomes.append((None, e))
+                else:
+                    outcomes.append((result, None))
+                cursor.execute("RELEASE job")
+            if changed:
+                # Read after this batch's own writes: what the database
+                # holds once it commits
+                refreshed = self._read_changes(cursor, changed)
+            last_seen, counts_seen = self._change_marks(cursor)
+            if last_seen - self._change_log_trimmed >= 2 * CHANGE_LOG_RETENTION:
+                cursor.execute("DELETE FROM change_log WHERE id <= ?",
+                               (last_seen - CHANGE_LOG_RETENTION, ))
+                self._change_log_trimmed = last_seen - CHANGE_LOG_RETENTION
+            cursor.execute("COMMIT")
+            self._change_log_seen = last_seen
+            self._change_counts_seen = counts_seen
+            self._data_version = data_version
+        except Exception as e:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            outcomes = [(None, e)] * len(jobs)
+            refreshed = None
+        for (func, args, loop, future), (result, error) in zip(jobs, outcomes):
+            loop.call_soon_threadsafe(_resolve_future, future, result, error)
+        if refreshed:
+            # Twice through the loop: the commands awaiting this batch
+            # resume first and apply their own results, which the refreshed
+            # aggregates already include and then replace
+            loop.call_soon_threadsafe(loop.call_soon,
+                                      self.apply_remote_changes, refreshed)
+
+    @staticmethod
+    def _change_marks(cursor):
+        # Last change_log entry and the change counts per table
+        last = cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0]
+        return last, dict(
+            cursor.execute("SELECT table_name, changes FROM change_counts"))
+
+    def _foreign_changes(self, cursor):
+        # table -> changed keys, or None when the whole table is to be
+        # reread, for the changes other processes made
+        changed = {
+            table: None
+            for table, changes in cursor.execute(
+                "SELECT table_name, changes FROM change_counts")
+            if changes != self._change_counts_seen.get(table)
+        }
+        first, last = cursor.execute(
+            "SELECT MIN(id), MAX(id) FROM change_log").fetchone()
+        if last is None or last <= self._change_log_seen:
+            return changed
+        if first > self._change_log_seen + 1:
+            # Trimmed past the last entry seen here: reread everything
+            return dict.fromkeys(CHANGE_LOG_TABLES)
+        for table, key in cursor.execute(
+                "SELECT table_name, key FROM change_log WHERE id > ?",
+            (self._change_log_seen, )):
+            if CHANGE_LOG_TABLES.get(table) is None:
+                changed[table] = None
+            elif table not in changed:
+                changed[table] = {key}
+            elif changed[table] is not None:
+                changed[table].add(key)
+        return changed
+
+    def _read_changes(self, cursor, changed):
+        # Current rows for the changed entries: per in-memory table
+        # (complete, {key: row or None}), where complete means every row of
+        # the table is listed; plus the aggregates and whether matches
+        # changed
+        refreshed = {}
+        for table, query, single in (
+            ('teams', "SELECT team_name, captain_id, division FROM teams",
+             "WHERE team_name = ?"),
+            ('team_captains',
+             "SELECT captain_id, team_name FROM team_captains",
+             "WHERE captain_id = ?")):
+            if table not in changed:
+                continue
+            keys = changed[table]
+            if keys is None:
+                rows = {row[0]: row[1:] for row in cursor.execute(query)}
+            else:
+                rows = {}
+                for key in keys:
+                    row = cursor.execute(f"{query} {single}",
+                                         (key, )).fetchone()
+                    rows[key] = row[1:] if row else None
+            refreshed[table] = (keys is None, rows)
+        if 'team_players' in changed:
+            keys = changed['team_players']
+            if keys is None:
+                rows = {}
+                for team_name, player_id in cursor.execute(
+                        "SELECT team_name, player_id FROM team_players ORDER BY team_name, position"
+                ):
+                    rows.setdefault(team_name, []).append(player_id)
+            else:
+                rows = {
+                    team_name: [
+                        player_id for player_id, in cursor.execute(
+                            "SELECT player_id FROM team_players WHERE team_name = ? ORDER BY position",
+                            (team_name, ))
+                    ]
+                    for team_name in keys
+                }
+            refreshed['team_players'] = (keys is None, rows)
+        if any(table in changed for table in AGGREGATE_SOURCES):
+            refreshed['aggregates'] = (
+                cursor.execute(PLAYER_STATS_TOTALS_QUERY).fetchone(),
+                cursor.execute(STANDINGS_LOAD_QUERY).fetchall(),
+                cursor.execute(
+                    CHAMPIONS_LEAGUE_STANDINGS_LOAD_QUERY).fetchall())
+        refreshed['matches'] = any(table in changed for table in MATCH_TABLES)
+        return refreshed
+
+    def apply_remote_changes(self, refreshed):
+        # Runs on the event loop. Entries with local changes that are not
+        # written yet keep the local version, which is what the database
+        # holds once they are saved.
+        unsaved = {
+            table:
+            set(table_changes).union(*(batch[table] for batch in self._saving))
+            for table, table_changes in self._changes.items()
+        }
+
+        if 'teams' in refreshed:
+            complete, rows = refreshed['teams']
+            if complete:
+                rows.update(dict.fromkeys(self.teams.keys() - rows.keys()))
+            for team_name, row in rows.items():
+                if team_name in unsaved['teams']:
+                    continue
+                team = self.teams.get(team_name)
+                if row is None:
+                    if team is not None:
+                        del self.teams[team_name]
+                        self.standings.remove_team(team_name)
+                        for player_id in team.players:
+                            if self.player_teams.get(player_id) == team_name:
+                                del self.player_teams[player_id]
+                    continue
+                captain_id, division = row
+                if team is None:
+                    self.teams[team_name] = Team(captain_id, division=division)
+                    self.standings.add_team(team_name, division)
+                else:
+                    team.captain_id = captain_id
+                    if team.division != division:
+                        team.division = division
+                        self.standings.set_division(team_name, division)
+
+        if 'team_players' in refreshed:
+            complete, rows = refreshed['team_players']
+            if complete:
+                rows.update(dict.fromkeys(self.teams.keys() - rows.keys(), []))
+            for team_name, players in rows.items():
+                team = self.teams.get(team_name)
+                if team is None or team_name in unsaved['team_players']:
+                    continue
+                for player_id in team.players:
+                    if self.player_teams.get(player_id) == team_name:
+                        del self.player_teams[player_id]
+                team.players = array('q', players)
+                for player_id in players:
+                    self.player_teams[player_id] = team_name
+
+        if 'team_captains' in refreshed:
+            complete, rows = refreshed['team_captains']
+            if complete:
+                rows.update(
+                    dict.fromkeys(self.team_captains.keys() - rows.keys()))
+            for captain_id, row in rows.items():
+                if captain_id in unsaved['team_captains']:
+                    continue
+                if row is None:
+                    self.team_captains.pop(captain_id, None)
+                else:
+                    self.team_captains[captain_id] = row[0]
+
+        for table, parts in self.TABLE_VERSIONS.items():
+            if table in refreshed:
+                self.bump(*parts)
+        if 'aggregates' in refreshed:
+            self.load_aggregates(*refreshed['aggregates'])
+            self.bump('standings', 'stats')
+        if refreshed['matches']:
+            self.bump('matches')
+
+    def close(self):
+        # Let the writer finish what is queued, then release the
+        # connections
+        if self.closed:
+            return
+        self.closed = True
+        self._write_queue.put(None)
+        self._writer.join()
+        while True:
+            try:
+                self._read_conns.get_nowait().close()
+            except queue.Empty:
+                break
+        self.conn.close()
 
-        # Load champions league teams
-        self.cursor.execute("SELECT * FROM champions_league_teams")
-        for row in self.cursor.fetchall():
-            team_name, captain_id, players_str, division = row
-            self.teams[team_name] = {
-                'captain_id': captain_id,
-                'players': list(map(int, players_str.split(','))),
-                'division': division
-            }
+    def load_data(self):
+        # Rows are streamed from the cursor into the structures the hot
+        # paths use: teams with their rosters, the player -> team and
+        # captain -> team maps, ranked standings, the stats totals and the
+        # league settings
 
-        # Load player stats
-        self.cursor.execute("SELECT * FROM player_stats")
-        for row in self.cursor.fetchall():
-            player_id, goals, assists, saves = row
-            self.player_stats[player_id] = {
-                'goals': goals,
-                'assists': assists,
-                'saves': saves
-            }
-            # different stats for champions league
-            self.player_stats[player_id]['champions_league_goals'] = 0
-            self.player_stats[player_id]['champions_league_assists'] = 0
-            self.player_stats[player_id]['champions_league_saves'] = 0
+        # Changes logged from here on are picked up by the writer
+        self._change_log_seen, self._change_counts_seen = self._change_marks(
+            self.cursor)
+
+        # Load teams
+        for team_name, captain_id, division in self.cursor.execute(
+                "SELECT team_name, captain_id, division FROM teams"):
+            self.teams[team_name] = Team(captain_id, division=division)
+
+        # Load rosters
+        for team_name, player_id in self.cursor.execute(
+                "SELECT team_name, player_id FROM team_players ORDER BY team_name, position"
+        ):
+            if team_name in self.teams:
+                self.teams[team_name].players.append(player_id)
+                self.player_teams[player_id] = team_name
+
+        # Load stats totals and standings
+        self.load_aggregates(
+            self.conn.execute(PLAYER_STATS_TOTALS_QUERY).fetchone(),
+            self.conn.execute(STANDINGS_LOAD_QUERY),
+            self.conn.execute(CHAMPIONS_LEAGUE_STANDINGS_LOAD_QUERY))
 
         # Load team captains
-        self.cursor.execute("SELECT * FROM team_captains")
-        for row in self.cursor.fetchall():
-            captain_id, team_name = row
+        for captain_id, team_name in self.cursor.execute(
+                "SELECT captain_id, team_name FROM team_captains"):
             self.team_captains[captain_id] = team_name
 
-        # Load player teams
-        self.cursor.execute("SELECT * FROM player_teams")
-        for row in self.cursor.fetchall():
-            player_id, team_name = row
-            self.player_teams[player_id] = team_name
+        # Load league settings
+        setting = self.cursor.execute(
+            "SELECT value FROM league_settings WHERE name = 'announcement_channel_id'"
+        ).fetchone()
+        self.announcement_channel_id = int(setting[0]) if setting else None
+
+    def load_aggregates(self, totals_row, standings_rows,
+                        champions_league_rows):
+        self.stats_totals = Counter(
+            dict(
+                zip(PLAYER_STATS_COLUMNS,
+                    (int(total) for total in totals_row))))
+
+        # Standings are ranked once here and then kept in order
+        self.standings.load(standings_rows)
+        self.champions_league_standings.load(champions_league_rows)
+        # Teams created before standings rows were added on creation
+        for team_name, team in self.teams.items():
+            self.standings.add_team(team_name, team.division)
+
+    async def set_announcement_channel(self, channel_id):
+        await self.execute(
+            "INSERT OR REPLACE INTO league_settings (name, value) VALUES ('announcement_channel_id', ?)",
+            (str(channel_id), ))
+        self.announcement_channel_id = channel_id
 
     def __del__(self):
         self.conn.close()
 
 
+# Names (member.name) of league members, per (guild, player). Rosters are
+# resolved through guild.get_member once and then served from here until the
+# user is renamed or the member leaves.
+class MemberNameCache:
+
+    def __init__(self):
+        self._names = {}  # player_id -> {guild_id: name}
+
+    def resolve(self, guild, player_ids):
+        # {player_id: name} for the players that are guild members
+        names = {}
+        for player_id in player_ids:
+            guild_names = self._names.setdefault(player_id, {})
+            name = guild_names.get(guild.id)
+            if name is None:
+                member = guild.get_member(player_id)
+                if member is None:
+                    continue
+                name = guild_names[guild.id] = member.name
+            names[player_id] = name
+        return names
+
+    def invalidate(self, player_id, guild_id=None):
+        if guild_id is None:
+            self._names.pop(player_id, None)
+        else:
+            self._names.get(player_id, {}).pop(guild_id, None)
+
+
+# Guild roles by name: guild_id -> {name: role_id}, built from guild.roles on
+# the first lookup in a guild. A lookup is then a dict access plus
+# guild.get_role instead of a scan over every role of the guild. Role
+# events drop the guild's map so it is rebuilt with the change.
+class RoleCache:
+
+    def __init__(self):
+        self._ids = {}
+
+    def get(self, guild, name):
+        names = self._ids.get(guild.id)
+        if names is None:
+            names = self._ids[guild.id] = {}
+            # Same role as discord.utils.get when names repeat
+            for role in guild.roles:
+                names.setdefault(role.name, role.id)
+        role_id = names.get(name)
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def invalidate(self, guild_id):
+        self._ids.pop(guild_id, None)
+
+
 # Score submission modal, with a league selector
 class LeagueSelector(discord.ui.Select):
 
@@ -234,11 +2171,15 @@ class LeagueSelector(discord.ui.Select):
 
 class ScoreSubmissionModal(Modal, title='Submit Match Score'):
 
-    def __init__(self, league_data: LeagueData, match_id: int,
+    def __init__(self, league_data: LeagueData, member_names: MemberNameCache,
+                 match_id: int, team1_name: str, team2_name: str,
                  interaction: discord.Interaction):
         super().__init__()
         self.league_data = league_data
+        self.member_names = member_names
         self.match_id = match_id
+        self.team1_name = team1_name
+        self.team2_name = team2_name
         self.interaction = interaction
         self.selected_league = "League"  # Default to regular league
 
@@ -255,31 +2196,19 @@ class ScoreSubmissionModal(Modal, title='Submit Match Score'):
                                 placeholder='Enter Team 2 score...',
                                 required=True)
 
-        # Get match details
-        self.league_data.cursor.execute(
-            "SELECT team1_name, team2_name FROM scheduled_matches WHERE match_id = ?",
-            (match_id, ))
-        match = self.league_data.cursor.fetchone()
-        if not match:
-            return
-
-        team1_name, team2_name = match
-
-        # Get team 1 players
-        team1_players = self.league_data.teams[team1_name]['players']
-        team1_player_names = []
-        for player_id in team1_players:
-            member = interaction.guild.get_member(player_id)
-            if member:
-                team1_player_names.append(member.name)
-
-        # Get team 2 players
-        team2_players = self.league_data.teams[team2_name]['players']
-        team2_player_names = []
-        for player_id in team2_players:
-            member = interaction.guild.get_member(player_id)
-            if member:
-                team2_player_names.append(member.name)
+        # Get both rosters' display names
+        team1_players = self.league_data.teams[team1_name].players
+        team2_players = self.league_data.teams[team2_name].players
+        names = self.member_names.resolve(interaction.guild,
+                                          team1_players + team2_players)
+        team1_player_names = [
+            names[player_id] for player_id in team1_players
+            if player_id in names
+        ]
+        team2_player_names = [
+            names[player_id] for player_id in team2_players
+            if player_id in names
+        ]
 
         # Create combined fields for team 1 stats
         self.team1_stats = TextInput(
@@ -307,56 +2236,36 @@ class ScoreSubmissionModal(Modal, title='Submit Match Score'):
         self.selected_league = self.league_selector.values[0]
         await interaction.response.defer()
 
+    @metrics.timed('modal')
     async def on_submit(self, interaction: discord.Interaction):
         try:
             score1 = int(self.score1.value)
             score2 = int(self.score2.value)
 
-            # Get match details
-            self.league_data.cursor.execute(
-                "SELECT team1_name, team2_name FROM scheduled_matches WHERE match_id = ?",
-                (self.match_id, ))
-            match = self.league_data.cursor.fetchone()
-            if not match:
-                await interaction.response.send_message("Match not found!",
-                                                        ephemeral=True)
-                return
+            team1_name, team2_name = self.team1_name, self.team2_name
 
-            team1_name, team2_name = match
-
-            # Get team players
-            team1_players = self.league_data.teams[team1_name]['players']
-            team2_players = self.league_data.teams[team2_name]['players']
+            # Snapshot the rosters: the writer thread reads them while other
+            # commands may change the live ones
+            team1_players = list(self.league_data.teams[team1_name].players)
+            team2_players = list(self.league_data.teams[team2_name].players)
 
             # Process team 1 stats
-            team1_stats_lines = self.team1_stats.value.strip().split('\n')
-            team1_stats = []
-            for line in team1_stats_lines:
-                if line.strip():
-                    try:
-                        goals, assists, saves = map(int,
-                                                    line.strip().split('/'))
-                        team1_stats.append((goals, assists, saves))
-                    except ValueError:
-                        await interaction.response.send_message(
-                            f"Invalid stats format for Team 1. Please use format: goals/assists/saves (e.g. 2/1/0)",
-                            ephemeral=True)
-                        return
+            try:
+                team1_stats = parse_stats_lines(self.team1_stats.value)
+            except ValueError:
+                await interaction.response.send_message(
+                    f"Invalid stats format for Team 1. Please use format: goals/assists/saves (e.g. 2/1/0)",
+                    ephemeral=True)
+                return
 
             # Process team 2 stats
-            team2_stats_lines = self.team2_stats.value.strip().split('\n')
-            team2_stats = []
-            for line in team2_stats_lines:
-                if line.strip():
-                    try:
-                        goals, assists, saves = map(int,
-                                                    line.strip().split('/'))
-                        team2_stats.append((goals, assists, saves))
-                    except ValueError:
-                        await interaction.response.send_message(
-                            f"Invalid stats format for Team 2. Please use format: goals/assists/saves (e.g. 2/1/0)",
-                            ephemeral=True)
-                        return
+            try:
+                team2_stats = parse_stats_lines(self.team2_stats.value)
+            except ValueError:
+                await interaction.response.send_message(
+                    f"Invalid stats format for Team 2. Please use format: goals/assists/saves (e.g. 2/1/0)",
+                    ephemeral=True)
+                return
 
             # Validate scores match the number of goals
             total_team1_goals = sum(stats[0] for stats in team1_stats)
@@ -376,45 +2285,27 @@ class ScoreSubmissionModal(Modal, title='Submit Match Score'):
             # Check if we're handling a Champions League match
             is_champions_league = self.selected_league == "Champions League"
 
-            # Update player stats
-            self.update_player_stats(team1_players, team1_stats, team2_players,
-                                     team2_stats, is_champions_league)
-
-            # Save match result to appropriate table
-            if is_champions_league:
-                self.league_data.cursor.execute(
-                    """INSERT INTO champions_league_match_results (match_id, team1_score, team2_score, team1_goals, team2_goals, team1_saves, team2_saves)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (self.match_id, score1, score2, self.team1_stats.value,
-                     self.team2_stats.value,
-                     sum(stats[2] for stats in team1_stats),
-                     sum(stats[2] for stats in team2_stats)))
-            else:
-                self.league_data.cursor.execute(
-                    """INSERT INTO match_results (match_id, team1_score, team2_score, team1_goals, team2_goals, team1_saves, team2_saves)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (self.match_id, score1, score2, self.team1_stats.value,
-                     self.team2_stats.value,
-                     sum(stats[2] for stats in team1_stats),
-                     sum(stats[2] for stats in team2_stats)))
-
-            # Update match status
-            self.league_data.cursor.execute(
-                "UPDATE scheduled_matches SET status = 'completed' WHERE match_id = ?",
-                (self.match_id, ))
-
-            # Update standings for regular league only
-            if not is_champions_league:
-                self.update_regular_league_standings(team1_name, team2_name,
-                                                     score1, score2)
-            else:
-                self.update_champions_league_standings(team1_name, team2_name,
-                                                       score1, score2)
+            # Write stats, result, match status and standings in a single
+            # transaction
+            try:
+                player_rows = await self.league_data.transaction(
+                    self.league_data.record_match_result, self.match_id,
+                    team1_name, team2_name, score1, score2, team1_players,
+                    team1_stats, team2_players, team2_stats,
+                    is_champions_league)
+            except (MatchAlreadyReported, MatchNotFound) as e:
+                await interaction.response.send_message(str(e), ephemeral=True)
+                return
+            self.league_data.apply_match_result(player_rows, team1_name,
+                                                team2_name, score1, score2,
+                                                is_champions_league)
 
-            self.league_data.save_data()
+            # Resolve both rosters once for every embed below
+            names = self.member_names.resolve(interaction.guild,
+                                              team1_players + team2_players)
 
             # Create detailed match result embed
-            embed = self.create_match_result_embed(interaction, team1_name,
+            embed = self.create_match_result_embed(names, team1_name,
                                                    team2_name, score1, score2,
                                                    team1_players, team1_stats,
                                                    team2_players, team2_stats,
@@ -423,122 +2314,37 @@ class ScoreSubmissionModal(Modal, title='Submit Match Score'):
             # Send to interaction
             await interaction.response.send_message(embed=embed)
 
-            # Send to announcement channel
-            await self.send_announcement(interaction, team1_name, team2_name,
-                                         score1, score2, team1_players,
-                                         team1_stats, team2_players,
-                                         team2_stats, is_champions_league)
+            # Queue for the announcement channel
+            self.send_announcement(interaction, names, team1_name, team2_name,
+                                   score1, score2, team1_players, team1_stats,
+                                   team2_players, team2_stats,
+                                   is_champions_league)
 
         except Exception as e:
             await interaction.response.send_message(
                 f"Error processing score: {str(e)}", ephemeral=True)
 
-    def update_player_stats(self, team1_players, team1_stats, team2_players,
-                            team2_stats, is_champions_league):
-        # Update player stats for team 1
-        for i, player_id in enumerate(team1_players):
-            if i < len(team1_stats):
-                goals, assists, saves = team1_stats[i]
-
-                # First make sure player exists in the database
-                self.league_data.cursor.execute(
-                    "INSERT OR IGNORE INTO player_stats (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves) VALUES (?, 0, 0, 0, 0, 0, 0)",
-                    (player_id, ))
-
-                # Update the appropriate stats
-                if is_champions_league:
-                    self.league_data.cursor.execute(
-                        "UPDATE player_stats SET champions_league_goals = champions_league_goals + ?, champions_league_assists = champions_league_assists + ?, champions_league_saves = champions_league_saves + ? WHERE player_id = ?",
-                        (goals, assists, saves, player_id))
-                else:
-                    self.league_data.cursor.execute(
-                        "UPDATE player_stats SET goals = goals + ?, assists = assists + ?, saves = saves + ? WHERE player_id = ?",
-                        (goals, assists, saves, player_id))
-
-        # Update player stats for team 2
-        for i, player_id in enumerate(team2_players):
-            if i < len(team2_stats):
-                goals, assists, saves = team2_stats[i]
-
-                # First make sure player exists in the database
-                self.league_data.cursor.execute(
-                    "INSERT OR IGNORE INTO player_stats (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves) VALUES (?, 0, 0, 0, 0, 0, 0)",
-                    (player_id, ))
-
-                # Update the appropriate stats
-                if is_champions_league:
-                    self.league_data.cursor.execute(
-                        "UPDATE player_stats SET champions_league_goals = champions_league_goals + ?, champions_league_assists = champions_league_assists + ?, champions_league_saves = champions_league_saves + ? WHERE player_id = ?",
-                        (goals, assists, saves, player_id))
-                else:
-                    self.league_data.cursor.execute(
-                        "UPDATE player_stats SET goals = goals + ?, assists = assists + ?, saves = saves + ? WHERE player_id = ?",
-                        (goals, assists, saves, player_id))
-
-    def update_regular_league_standings(self, team1_name, team2_name, score1,
-                                        score2):
-        if score1 > score2:
-            # Team 1 wins
-            self.league_data.cursor.execute(
-                "UPDATE standings SET wins = wins + 1 WHERE team_name = ?",
-                (team1_name, ))
-            self.league_data.cursor.execute(
-                "UPDATE standings SET losses = losses + 1 WHERE team_name = ?",
-                (team2_name, ))
-        elif score1 < score2:
-            # Team 2 wins
-            self.league_data.cursor.execute(
-                "UPDATE standings SET wins = wins + 1 WHERE team_name = ?",
-                (team2_name, ))
-            self.league_data.cursor.execute(
-                "UPDATE standings SET losses = losses + 1 WHERE team_name = ?",
-                (team1_name, ))
-        else:
-            # Draw
-            self.league_data.cursor.execute(
-                "UPDATE standings SET draws = draws + 1 WHERE team_name = ?",
-                (team1_name, ))
-            self.league_data.cursor.execute(
-                "UPDATE standings SET draws = draws + 1 WHERE team_name = ?",
-                (team2_name, ))
-
-    def update_champions_league_standings(self, team1_name, team2_name, score1,
-                                          score2):
-        # Make sure teams exist in champions_league_standings
-        self.league_data.cursor.execute(
-            "INSERT OR IGNORE INTO champions_league_standings (team_name, wins, losses, draws) VALUES (?, 0, 0, 0)",
-            (team1_name, ))
-        self.league_data.cursor.execute(
-            "INSERT OR IGNORE INTO champions_league_standings (team_name, wins, losses, draws) VALUES (?, 0, 0, 0)",
-            (team2_name, ))
-
-        if score1 > score2:
-            # Team 1 wins
-            self.league_data.cursor.execute(
-                "UPDATE champions_league_standings SET wins = wins + 1 WHERE team_name = ?",
-                (team1_name, ))
-            self.league_data.cursor.execute(
-                "UPDATE champions_league_standings SET losses = losses + 1 WHERE team_name = ?",
-                (team2_name, ))
-        elif score1 < score2:
-            # Team 2 wins
-            self.league_data.cursor.execute(
-                "UPDATE champions_league_standings SET wins = wins + 1 WHERE team_name = ?",
-                (team2_name, ))
-            self.league_data.cursor.execute(
-                "UPDATE champions_league_standings SET losses = losses + 1 WHERE team_name = ?",
-                (team1_name, ))
-        else:
-            # Draw
-            self.league_data.cursor.execute(
-                "UPDATE champions_league_standings SET draws = draws + 1 WHERE team_name = ?",
-                (team1_name, ))
-            self.league_data.cursor.execute(
-                "UPDATE champions_league_standings SET draws = draws + 1 WHERE team_name = ?",
-                (team2_name, ))
-
-    def create_match_result_embed(self, interaction, team1_name, team2_name,
-                                  score1, score2, team1_players, team1_stats,
+    @staticmethod
+    def team_stats_text(names, score, players, stats):
+        # One pass over the stats lines builds all three sections
+        goals_text, assists_text, saves_text = "", "", ""
+        for player_id, (goals, assists, saves) in zip(players, stats):
+            name = names.get(player_id)
+            if not name:
+                continue
+            if goals > 0:
+                goals_text += f"⚽ {name}: {goals}\n"
+            if assists > 0:
+                assists_text += f"🎯 {name}: {assists}\n"
+            if saves > 0:
+                saves_text += f"🧤 {name}: {saves}\n"
+        return (f"Score: {score}\n\n"
+                f"**Goals:**\n{goals_text}"
+                f"\n**Assists:**\n{assists_text}"
+                f"\n**Saves:**\n{saves_text}")
+
+    def create_match_result_embed(self, names, team1_name, team2_name, score1,
+                                  score2, team1_players, team1_stats,
                                   team2_players, team2_stats,
                                   is_champions_league):
         league_name = "Champions League" if is_champions_league else "League"
@@ -548,110 +2354,52 @@ class ScoreSubmissionModal(Modal, title='Submit Match Score'):
             color=discord.Color.blue())
 
         # Team 1 stats
-        team1_stats_text = f"Score: {score1}\n\n"
-
-        # Goals
-        team1_stats_text += "**Goals:**\n"
-        for i, player_id in enumerate(team1_players):
-            if i < len(team1_stats) and team1_stats[i][0] > 0:
-                member = interaction.guild.get_member(player_id)
-                if member:
-                    team1_stats_text += f"⚽ {member.name}: {team1_stats[i][0]}\n"
-
-        # Assists
-        team1_stats_text += "\n**Assists:**\n"
-        for i, player_id in enumerate(team1_players):
-            if i < len(team1_stats) and team1_stats[i][1] > 0:
-                member = interaction.guild.get_member(player_id)
-                if member:
-                    team1_stats_text += f"🎯 {member.name}: {team1_stats[i][1]}\n"
-
-        # Saves
-        team1_stats_text += "\n**Saves:**\n"
-        for i, player_id in enumerate(team1_players):
-            if i < len(team1_stats) and team1_stats[i][2] > 0:
-                member = interaction.guild.get_member(player_id)
-                if member:
-                    team1_stats_text += f"🧤 {member.name}: {team1_stats[i][2]}\n"
-
         embed.add_field(name=f"{team1_name}",
-                        value=team1_stats_text,
+                        value=self.team_stats_text(names, score1,
+                                                   team1_players, team1_stats),
                         inline=True)
 
         # VS
         embed.add_field(name="vs", value="", inline=True)
 
         # Team 2 stats
-        team2_stats_text = f"Score: {score2}\n\n"
-
-        # Goals
-        team2_stats_text += "**Goals:**\n"
-        for i, player_id in enumerate(team2_players):
-            if i < len(team2_stats) and team2_stats[i][0] > 0:
-                member = interaction.guild.get_member(player_id)
-                if member:
-                    team2_stats_text += f"⚽ {member.name}: {team2_stats[i][0]}\n"
-
-        # Assists
-        team2_stats_text += "\n**Assists:**\n"
-        for i, player_id in enumerate(team2_players):
-            if i < len(team2_stats) and team2_stats[i][1] > 0:
-                member = interaction.guild.get_member(player_id)
-                if member:
-                    team2_stats_text += f"🎯 {member.name}: {team2_stats[i][1]}\n"
-
-        # Saves
-        team2_stats_text += "\n**Saves:**\n"
-        for i, player_id in enumerate(team2_players):
-            if i < len(team2_stats) and team2_stats[i][2] > 0:
-                member = interaction.guild.get_member(player_id)
-                if member:
-                    team2_stats_text += f"🧤 {member.name}: {team2_stats[i][2]}\n"
-
         embed.add_field(name=f"{team2_name}",
-                        value=team2_stats_text,
+                        value=self.team_stats_text(names, score2,
+                                                   team2_players, team2_stats),
                         inline=True)
 
         return embed
 
-    async def send_announcement(self, interaction, team1_name, team2_name,
-                                score1, score2, team1_players, team1_stats,
-                                team2_players, team2_stats,
-                                is_champions_league):
-        try:
-            announcement_channel = interaction.guild.get_channel(
-                int(os.getenv("ANNOUNCEMENT_CHANNEL_ID")))
-            if announcement_channel:
-                league_name = "Champions League" if is_champions_league else "League"
-
-                announcement_embed = discord.Embed(
-                    title=f"{league_name} Match Result Announced!",
-                    description=
-                    f"A match between {team1_name} and {team2_name} has been completed!",
-                    color=discord.Color.green())
-                announcement_embed.add_field(
-                    name="Result",
-                    value=f"{team1_name} {score1} - {score2} {team2_name}")
-
-                # Add goal scorers
-                goal_scorers = "**Goal Scorers:**\n"
-                for i, player_id in enumerate(team1_players):
-                    if i < len(team1_stats) and team1_stats[i][0] > 0:
-                        member = interaction.guild.get_member(player_id)
-                        if member:
-                            goal_scorers += f"⚽ {member.name} ({team1_name}): {team1_stats[i][0]}\n"
-                for i, player_id in enumerate(team2_players):
-                    if i < len(team2_stats) and team2_stats[i][0] > 0:
-                        member = interaction.guild.get_member(player_id)
-                        if member:
-                            goal_scorers += f"⚽ {member.name} ({team2_name}): {team2_stats[i][0]}\n"
-                announcement_embed.add_field(name="Goal Scorers",
-                                             value=goal_scorers,
-                                             inline=False)
-
-                await announcement_channel.send(embed=announcement_embed)
-        except Exception as e:
-            print(f"Error sending to announcement channel: {e}")
+    def send_announcement(self, interaction, names, team1_name, team2_name,
+                          score1, score2, team1_players, team1_stats,
+                          team2_players, team2_stats, is_champions_league):
+        league_name = "Champions League" if is_champions_league else "League"
+
+        announcement_embed = discord.Embed(
+            title=f"{league_name} Match Result Announced!",
+            description=
+            f"A match between {team1_name} and {team2_name} has been completed!",
+            color=discord.Color.green())
+        announcement_embed.add_field(
+            name="Result",
+            value=f"{team1_name} {score1} - {score2} {team2_name}")
+
+        # Add goal scorers
+        goal_scorers = "**Goal Scorers:**\n"
+        for team_name, players, stats in ((team1_name, team1_players,
+                                           team1_stats),
+                                          (team2_name, team2_players,
+                                           team2_stats)):
+            for player_id, (goals, _, _) in zip(players, stats):
+                if goals > 0 and names.get(player_id):
+                    goal_scorers += f"⚽ {names[player_id]} ({team_name}): {goals}\n"
+        announcement_embed.add_field(name="Goal Scorers",
+                                     value=goal_scorers,
+                                     inline=False)
+
+        interaction.client.announcements.announce_in(interaction.guild,
+                                                     self.league_data,
+                                                     announcement_embed)
 
 
 class ScheduleMatchModal(Modal, title='Schedule Match'):
@@ -672,6 +2420,7 @@ class ScheduleMatchModal(Modal, title='Schedule Match'):
         self.add_item(self.date)
         self.add_item(self.time)
 
+    @metrics.timed('modal')
     async def on_submit(self, interaction: discord.Interaction):
         try:
             # Parse date
@@ -698,12 +2447,12 @@ class ScheduleMatchModal(Modal, title='Schedule Match'):
             scheduled_time = scheduled_datetime.strftime("%Y-%m-%d %H:%M:%S")
 
             # Schedule the match
-            self.league_data.cursor.execute(
+            await self.league_data.execute(
                 """
                 INSERT INTO scheduled_matches (team1_name, team2_name, scheduled_time, status)
                 VALUES (?, ?, ?, ?)
             """, (self.team1, self.team2, scheduled_time, 'scheduled'))
-            self.league_data.conn.commit()
+            self.league_data.bump('matches')
 
             # Create embed
             embed = discord.Embed(
@@ -717,26 +2466,19 @@ class ScheduleMatchModal(Modal, title='Schedule Match'):
                             value=scheduled_datetime.strftime("%H:%M"))
             embed.add_field(name="Status", value="Scheduled")
 
-            # Send to announcement channel
-            try:
-                announcement_channel = interaction.guild.get_channel(
-                    int(os.getenv("ANNOUNCEMENT_CHANNEL_ID")))
-                if announcement_channel:
-                    announcement_embed = discord.Embed(
-                        title="New Match Scheduled!",
-                        description=f"A new match has been scheduled!",
-                        color=discord.Color.blue())
-                    announcement_embed.add_field(
-                        name="Teams", value=f"{self.team1} vs {self.team2}")
-                    announcement_embed.add_field(
-                        name="Date",
-                        value=scheduled_datetime.strftime("%Y-%m-%d"))
-                    announcement_embed.add_field(
-                        name="Time",
-                        value=scheduled_datetime.strftime("%H:%M"))
-                    await announcement_channel.send(embed=announcement_embed)
-            except Exception as e:
-                print(f"Error sending to announcement channel: {e}")
+            # Queue for the announcement channel
+            announcement_embed = discord.Embed(
+                title="New Match Scheduled!",
+                description=f"A new match has been scheduled!",
+                color=discord.Color.blue())
+            announcement_embed.add_field(name="Teams",
+                                         value=f"{self.team1} vs {self.team2}")
+            announcement_embed.add_field(
+                name="Date", value=scheduled_datetime.strftime("%Y-%m-%d"))
+            announcement_embed.add_field(
+                name="Time", value=scheduled_datetime.strftime("%H:%M"))
+            interaction.client.announcements.announce_in(
+                interaction.guild, self.league_data, announcement_embed)
 
             await interaction.response.send_message(embed=embed)
 
@@ -745,106 +2487,631 @@ class ScheduleMatchModal(Modal, title='Schedule Match'):
                 f"Error scheduling match: {str(e)}", ephemeral=True)
 
 
+# Built embeds keyed by guild and command (plus arguments), each remembered
+# with the data version it was built from and rebuilt once that version moves on
+class EmbedCache:
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def put(self, key, version, value):
+        self._entries[key] = (version, value)
+        return value
+
+    def get_or_build(self, key, version, build):
+        value = self.get(key, version)
+        if value is None:
+            value = self.put(key, version, build())
+        return value
+
+
+# Previous/Next navigation over a keyset-paginated query. Each page is
+# fetched once, when first shown, and its embed is kept for the life of the
+# view so flipping back and forth does not query again.
+class PaginatedView(discord.ui.View):
+
+    def __init__(self,
+                 fetch_page,
+                 page_key,
+                 render_page,
+                 first_key,
+                 page_size=LIST_PAGE_SIZE,
+                 embed_cache=None,
+                 cache_key=None,
+                 version=None):
+        super().__init__(timeout=300)
+        self.fetch_page = fetch_page  # async (after_key, limit) -> rows
+        self.page_key = page_key  # row -> sort key of that row
+        self.render_page = render_page  # (rows, page_number) -> Embed
+        self.page_size = page_size
+        self.page = 0
+        self._pages = []  # rendered embeds
+        self._next_keys = [first_key]  # key each page starts after
+        self._has_more = []
+        # Pages are also shared between views while the data is unchanged
+        self.embed_cache = embed_cache
+        self.cache_key = cache_key
+        self.version = version
+
+    async def _load(self, page):
+        if page < len(self._pages):
+            return self._pages[page]
+        cached = None
+        if self.embed_cache is not None:
+            cached = self.embed_cache.get((self.cache_key, page), self.version)
+        if cached is None:
+            # Fetch one extra row to know whether a next page exists
+            rows = await self.fetch_page(self._next_keys[page],
+                                         self.page_size + 1)
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            cached = (self.render_page(rows, page) if rows else None, has_more,
+                      self.page_key(rows[-1]) if rows else None)
+            if self.embed_cache is not None:
+                self.embed_cache.put((self.cache_key, page), self.version,
+                                     cached)
+        embed, has_more, next_key = cached
+        self._pages.append(embed)
+        self._has_more.append(has_more)
+        if next_key is not None:
+            self._next_keys.append(next_key)
+        return embed
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = not self._has_more[self.page]
+
+    async def start(self, interaction: discord.Interaction, empty_message):
+        embed = await self._load(0)
+        if embed is None:
+            await interaction.response.send_message(empty_message,
+                                                    ephemeral=True)
+            return
+        self._update_buttons()
+        if self._has_more[0]:
+            await interaction.response.send_message(embed=embed, view=self)
+        else:
+            await interaction.response.send_message(embed=embed)
+
+    async def _show(self, interaction: discord.Interaction):
+        embed = await self._load(self.page)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label='Previous', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction,
+                            button: discord.ui.Button):
+        self.page = max(self.page - 1, 0)
+        await self._show(interaction)
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction,
+                        button: discord.ui.Button):
+        if self._has_more[self.page]:
+            self.page += 1
+        await self._show(interaction)
+
+
 # Bot setup
-class RematchBot(commands.Bot):
+# Background sender for channel announcements. Commands queue embeds and
+# return right away; embeds for the same channel that arrive within
+# ANNOUNCEMENT_WINDOW are sent together as one multi-embed message.
+class AnnouncementDispatcher:
+
+    def __init__(self, client, window=ANNOUNCEMENT_WINDOW):
+        self.client = client
+        self.window = window
+        self._queue = asyncio.Queue()
+        self._channels = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Send what is still queued, then end the task
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    def announce(self, channel_id, embed):
+        self._queue.put_nowait((channel_id, embed))
+
+    def announce_in(self, guild, league_data, embed):
+        # To the announcement channel set for the league, or else
+        # ANNOUNCEMENT_CHANNEL_ID, and only when that channel is in the
+        # guild; other guilds never see another league's announcements
+        channel_id = (league_data.announcement_channel_id
+                      or ANNOUNCEMENT_CHANNEL_ID)
+        if guild is not None and guild.get_channel(channel_id):
+            self.announce(channel_id, embed)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.window
+            while True:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(),
+                                                  deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            by_channel = {}
+            for channel_id, embed in batch:
+                by_channel.setdefault(channel_id, []).append(embed)
+            for channel_id, embeds in by_channel.items():
+                for message_embeds in self._messages(embeds):
+                    try:
+                        await self._send(channel_id, message_embeds)
+                    except Exception as e:
+                        log.warning(
+                            "Error sending to announcement channel: %s", e)
+
+    @staticmethod
+    def _messages(embeds):
+        # Split into messages within Discord's embed count and size limits
+        message, size = [], 0
+        for embed in embeds:
+            if message and (len(message) == MAX_EMBEDS_PER_MESSAGE or
+                            size + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE):
+                yield message
+                message, size = [], 0
+            message.append(embed)
+            size += len(embed)
+        if message:
+            yield message
+
+    async def _channel(self, channel_id):
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self.client.get_channel(channel_id)
+            if channel is None:
+                channel = await self.client.fetch_channel(channel_id)
+            self._channels[channel_id] = channel
+        return channel
+
+    async def _send(self, channel_id, embeds):
+        channel = await self._channel(channel_id)
+        for attempt in range(ANNOUNCEMENT_RETRIES):
+            try:
+                await channel.send(embeds=embeds)
+                return
+            except discord.RateLimited as e:
+                delay = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    raise
+                delay = ANNOUNCEMENT_RETRY_DELAY * 2**attempt
+            metrics.count_rate_limit('announcements')
+            log.warning("Announcement rate limited, retrying in %.1fs", delay)
+            await asyncio.sleep(delay)
+        raise RuntimeError(
+            f"still rate limited after {ANNOUNCEMENT_RETRIES} attempts")
+
+
+# League state per guild. Each guild gets its own LeagueData, so its own
+# SQLite file and writer thread, opened and loaded on the guild's first
+# command and closed again after LEAGUE_IDLE_TIMEOUT without one; a busy or
+# large league never queues behind another one's writes.
+# The default league (league_data.db) serves LEAGUE_GUILD_ID and anything
+# outside a guild, and also holds the bot-wide tables. guilds returns the
+# guilds the bot is in, used to find the owner of an existing default league
+# when LEAGUE_GUILD_ID isn't set.
+class GuildLeagues:
+
+    def __init__(self,
+                 default,
+                 poll_interval=CHANGE_POLL_INTERVAL,
+                 guilds=list):
+        self.default = default
+        self.poll_interval = poll_interval
+        self.guilds = guilds
+        self.default_guild_id = LEAGUE_GUILD_ID
+        self.default_in_use = default.cursor.execute(
+            "SELECT 1 FROM teams LIMIT 1").fetchone() is not None
+        self._leagues = {}
+        self._last_used = {}
+        self._locks = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self):
+        # Keep every open league in step with other processes writing its
+        # database (see LeagueData.sync)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            leagues = list(self._leagues.items())
+            results = await asyncio.gather(*(league.sync()
+                                             for _, league in leagues),
+                                           return_exceptions=True)
+            for (guild_id, _), result in zip(leagues, results):
+                if isinstance(result, Exception):
+                    log.warning("Change check of guild %s failed: %s",
+                                guild_id, result)
+            await self._close_idle()
+
+    async def _close_idle(self):
+        # The default league stays open, it holds the bot-wide tables
+        loop = asyncio.get_running_loop()
+        idle_since = loop.time() - LEAGUE_IDLE_TIMEOUT
+        for guild_id, last_used in list(self._last_used.items()):
+            if guild_id is None or last_used > idle_since:
+                continue
+            del self._last_used[guild_id]
+            league = self._leagues.pop(guild_id, None)
+            if league is not None:
+                await loop.run_in_executor(None, league.close)
+                log.info("Closed the idle league of guild %s", guild_id)
+
+    def claim_default(self):
+        # Give a league already in league_data.db to the only guild rather
+        # than start it on an empty one; with several guilds there is no
+        # telling whose it is
+        if self.default_guild_id is not None or not self.default_in_use:
+            return
+        guilds = self.guilds()
+        if len(guilds) != 1:
+            raise RuntimeError(
+                f"league_data.db holds a league but LEAGUE_GUILD_ID is not set "
+                f"and the bot is in {len(guilds)} guilds; set LEAGUE_GUILD_ID "
+                f"to the guild the league belongs to")
+        self.default_guild_id = guilds[0].id
+        log.warning(
+            "LEAGUE_GUILD_ID is not set, guild %s keeps the league in "
+            "league_data.db", self.default_guild_id)
+
+    async def get(self, guild):
+        guild_id = guild.id if guild else None
+        if guild_id is not None:
+            self.claim_default()
+        if guild_id == self.default_guild_id:
+            guild_id = None
+        self._last_used[guild_id] = asyncio.get_running_loop().time()
+        league = self._leagues.get(guild_id)
+        if league is None:
+            async with self._locks.setdefault(guild_id, asyncio.Lock()):
+                league = self._leagues.get(guild_id)
+                if league is None:
+                    loop = asyncio.get_running_loop()
+                    league = await loop.run_in_executor(
+                        None, self._open, guild_id)
+                    self._leagues[guild_id] = league
+        return league
+
+    def _open(self, guild_id):
+        if guild_id is None:
+            league = self.default
+        else:
+            os.makedirs(LEAGUE_DATA_DIR, exist_ok=True)
+            league = LeagueData(
+                os.path.join(LEAGUE_DATA_DIR, f"league_{guild_id}.db"))
+        started = time.perf_counter()
+        league.load_data()
+        log.info("Loaded league of guild %s in %.2fs", guild_id,
+                 time.perf_counter() - started)
+        return league
+
+    def close(self):
+        # Let the writers of every league, the default one included, drain
+        # their queues
+        for league in self._leagues.values():
+            league.close()
+        self.default.close()
+
+
+# Times every slash command from the check that runs before it to its
+# completion or error, and names the task after the command so the SQL it
+# runs is charged to it
+class MetricsCommandTree(app_commands.CommandTree):
+
+    async def interaction_check(self, interaction):
+        if (interaction.type is discord.InteractionType.application_command
+                and interaction.command is not None):
+            interaction.extras['started'] = time.perf_counter()
+            current_command.set(interaction.command.qualified_name)
+        return True
+
+    async def on_error(self, interaction, error):
+        metrics.observe_interaction(interaction, failed=True)
+        await super().on_error(interaction, error)
+
+
+class RematchBot(commands.AutoShardedBot):
 
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True
 
-        super().__init__(command_prefix='!', intents=intents)
+        super().__init__(command_prefix='!',
+                         intents=intents,
+                         shard_count=SHARD_COUNT,
+                         tree_cls=MetricsCommandTree)
+        self._metrics_runner = None
+
+        # Count Discord REST calls by route and outcome
+        request = self.http.request
+
+        async def counted_request(route, **kwargs):
+            status = 'error'
+            try:
+                response = await request(route, **kwargs)
+                status = 'ok'
+                return response
+            except discord.HTTPException as e:
+                status = e.status
+                raise
+            finally:
+                metrics.count_request(route.method, route.path, status)
+
+        self.http.request = counted_request
         self.league_data = LeagueData()
-        self.league_data.load_data()
+        self.leagues = GuildLeagues(self.league_data,
+                                    guilds=lambda: self.guilds)
+        self.member_names = MemberNameCache()
+        self.roles = RoleCache()
+        self.embeds = EmbedCache()
+        self.announcements = AnnouncementDispatcher(self)
+        for name, detail in self.league_data.check_query_plans():
+            log.warning("Hot query %s does a full table scan: %s", name,
+                        detail)
 
     async def setup_hook(self):
-        # Force sync commands globally and for all guilds
-        await self.tree.sync()
+        self.announcements.start()
+        self.leagues.start()
+        await self.start_metrics_server()
+
+        # Sync commands globally and for all guilds, skipping the scopes
+        # whose commands are unchanged since the last sync
+        await self.sync_command_tree()
         for guild in self.guilds:
-            await self.tree.sync(guild=guild)
+            await self.sync_command_tree(guild)
+
+    async def start_metrics_server(self):
+        if not METRICS_PORT:
+            return
+
+        async def scrape(request):
+            return web.Response(body=metrics.render().encode(),
+                                headers={
+                                    'Content-Type':
+                                    'text/plain; version=0.0.4; charset=utf-8'
+                                })
+
+        app = web.Application()
+        app.router.add_get('/metrics', scrape)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+        except OSError as e:
+            log.warning("Metrics endpoint not started on %s:%s: %s",
+                        METRICS_HOST, METRICS_PORT, e)
+            await runner.cleanup()
+            return
+        self._metrics_runner = runner
+
+    async def invoke(self, ctx):
+        # Prefix commands, timed like the slash commands
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        name = ctx.command.qualified_name
+        token = current_command.set(name)
+        started = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            current_command.reset(token)
+            metrics.observe_command('prefix', name,
+                                    time.perf_counter() - started,
+                                    ctx.command_failed)
+
+    async def on_app_command_completion(self, interaction, command):
+        metrics.observe_interaction(interaction)
+
+    def command_fingerprint(self, guild=None):
+        # Stable hash of the command payloads Discord would receive
+        payloads = sorted((command.to_dict(self.tree)
+                           for command in self.tree.get_commands(guild=guild)),
+                          key=lambda payload:
+                          (payload.get('type', 1), payload['name']))
+        return hashlib.sha256(json.dumps(payloads,
+                                         sort_keys=True).encode()).hexdigest()
+
+    async def sync_command_tree(self, guild=None, force=False):
+        # Returns whether the scope was synced
+        scope = str(guild.id) if guild else 'global'
+        fingerprint = self.command_fingerprint(guild)
+        if not force:
+            stored = await self.league_data.fetchone(
+                "SELECT fingerprint FROM command_sync WHERE scope = ?",
+                (scope, ))
+            if stored and stored[0] == fingerprint:
+                log.info("Commands for %s unchanged, sync skipped", scope)
+                return False
+
+        started = time.perf_counter()
+        await self.tree.sync(guild=guild)
+        log.info("Synced commands for %s in %.2fs", scope,
+                 time.perf_counter() - started)
+        await self.league_data.execute(
+            "INSERT OR REPLACE INTO command_sync (scope, fingerprint) VALUES (?, ?)",
+            (scope, fingerprint))
+        return True
+
+    async def close(self):
+        await self.announcements.stop()
+        await self.leagues.stop()
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+        await super().close()
+        self.leagues.close()
+
+    async def on_ready(self):
+        # Stop rather than leave league_data.db's league without its guild
+        try:
+            self.leagues.claim_default()
+        except RuntimeError as e:
+            log.critical("%s", e)
+            await self.close()
+
+    # Keep cached member names in step with the users; the cache holds
+    # the account name, which only changes in on_user_update
+    async def on_user_update(self, before, after):
+        if before.name != after.name:
+            self.member_names.invalidate(after.id)
+
+    async def on_member_remove(self, member):
+        self.member_names.invalidate(member.id, member.guild.id)
+
+    # ... and the role name cache in step with the guild roles
+    async def on_guild_role_create(self, role):
+        self.roles.invalidate(role.guild.id)
+
+    async def on_guild_role_delete(self, role):
+        self.roles.invalidate(role.guild.id)
+
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name:
+            self.roles.invalidate(after.guild.id)
 
 
 bot = RematchBot()
 
 
+# Helper function: does user have the role with this name?
+def has_role(user, guild, name):
+    role = bot.roles.get(guild, name)
+    return role is not None and user.get_role(role.id) is not None
+
+
 # Helper function: is user a captain of a team?
 def is_team_captain(user, guild, team_name):
-    captain_role = discord.utils.get(guild.roles, name=f"{team_name} Captain")
-    return captain_role and captain_role in user.roles
+    return has_role(user, guild, f"{team_name} Captain")
 
 
 # Helper function: is user a league admin?
 def is_league_admin(user, guild):
-    admin_roles = [
-        discord.utils.get(guild.roles, name="League Admin"),
-        discord.utils.get(guild.roles, name="Admin")
-    ]
-    return any(
-        role for role in admin_roles
-        if role and role in user.roles) or user.guild_permissions.administrator
+    return (user.guild_permissions.administrator
+            or has_role(user, guild, "League Admin")
+            or has_role(user, guild, "Admin"))
+
+
+# Helper function: apply role changes to several members. changes maps each
+# member to (roles to add, roles to remove); every member gets a single
+# member.edit with its final role list, at most ROLE_EDIT_CONCURRENCY at a
+# time. Returns the members whose edit failed.
+async def edit_member_roles(changes):
+    semaphore = asyncio.Semaphore(ROLE_EDIT_CONCURRENCY)
+
+    async def edit(member, add, remove):
+        current = {role for role in member.roles if not role.is_default()}
+        roles = (current - set(remove)) | set(add)
+        if roles == current:
+            return None
+        async with semaphore:
+            try:
+                await member.edit(roles=list(roles))
+            except discord.HTTPException as e:
+                log.warning("Error updating roles of %s: %s", member, e)
+                return member
+        return None
+
+    failed = await asyncio.gather(*(edit(member, add, remove)
+                                    for member, (add,
+                                                 remove) in changes.items()))
+    return [member for member in failed if member is not None]
+
+
+# Helper function: the @Captain role, created if missing
+async def get_captain_global_role(guild):
+    captain_global_role = bot.roles.get(guild, "Captain")
+    if not captain_global_role:
+        captain_global_role = await guild.create_role(name="Captain")
+    return captain_global_role
 
 
 # Team Management Commands
 @bot.tree.command(name="create_team",
                   description="Create a new team and become its captain")
 async def create_team(interaction: discord.Interaction, team_name: str):
+    league_data = await bot.leagues.get(interaction.guild)
     user_id = interaction.user.id
 
     # Check if user is already a captain
-    if user_id in bot.league_data.team_captains:
+    if user_id in league_data.team_captains:
         await interaction.response.send_message(
             "You are already a team captain!", ephemeral=True)
         return
 
     # Check if user is already in a team
-    if user_id in bot.league_data.player_teams:
+    if user_id in league_data.player_teams:
         await interaction.response.send_message("You are already in a team!",
                                                 ephemeral=True)
         return
 
     # Check if team name exists
-    if team_name in bot.league_data.teams:
+    if team_name in league_data.teams:
         await interaction.response.send_message(
             "A team with this name already exists!", ephemeral=True)
         return
 
     # Create team
-    bot.league_data.teams[team_name] = {
-        'captain_id': user_id,
-        'players': [user_id]
-    }
-    bot.league_data.team_captains[user_id] = team_name
-    bot.league_data.player_teams[user_id] = team_name
-    bot.league_data.save_data()
-
-    # Create a role for the team
-    team_role = await interaction.guild.create_role(name=team_name)
-    await interaction.user.add_roles(team_role)
-
-    # Create a role for the captain
-    captain_role = await interaction.guild.create_role(
-        name=f"{team_name} Captain")
-    await interaction.user.add_roles(captain_role)
-
-    # Ensure the @Captain role exists and assign it
-    captain_global_role = discord.utils.get(interaction.guild.roles,
-                                            name="Captain")
-    if not captain_global_role:
-        captain_global_role = await interaction.guild.create_role(
-            name="Captain")
-    await interaction.user.add_roles(captain_global_role)
+    league_data.add_team(team_name, user_id)
+    await interaction.response.defer(ephemeral=True)
+    await league_data.save_data()
+
+    # Create the team and captain roles, make sure the @Captain role exists,
+    # then give all three to the captain in one edit
+    guild = interaction.guild
+    team_role, captain_role, captain_global_role = await asyncio.gather(
+        guild.create_role(name=team_name),
+        guild.create_role(name=f"{team_name} Captain"),
+        get_captain_global_role(guild))
+    await edit_member_roles({
+        interaction.user: ((team_role, captain_role, captain_global_role), ())
+    })
 
     embed = discord.Embed(title="Team Created",
                           description=f"Team '{team_name}' has been created!",
                           color=discord.Color.green())
     embed.add_field(name="Captain", value=f"<@{user_id}>")
 
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 
 @bot.tree.command(name="add_player", description="Add a player to your team")
 async def add_player(interaction: discord.Interaction, user: discord.Member,
                      team_name: str):
+    league_data = await bot.leagues.get(interaction.guild)
     guild = interaction.guild
     if not (is_team_captain(interaction.user, guild, team_name)
             or is_league_admin(interaction.user, guild)):
@@ -858,24 +3125,23 @@ async def add_player(interaction: discord.Interaction, user: discord.Member,
     target_id = user.id
 
     # Check if target is already in a team
-    if target_id in bot.league_data.player_teams:
+    if target_id in league_data.player_teams:
         await interaction.response.send_message(
             "This player is already in a team!", ephemeral=True)
         return
 
     # Check if the team exists
-    if team_name not in bot.league_data.teams:
+    if team_name not in league_data.teams:
         await interaction.response.send_message("This team does not exist!",
                                                 ephemeral=True)
         return
 
     # Add player to the team
-    bot.league_data.teams[team_name]['players'].append(target_id)
-    bot.league_data.player_teams[target_id] = team_name
-    bot.league_data.save_data()
+    league_data.add_player(team_name, target_id)
+    await league_data.save_data()
 
     # Assign the team role to the player
-    role = discord.utils.get(interaction.guild.roles, name=team_name)
+    role = bot.roles.get(guild, team_name)
     if role:
         await user.add_roles(role)
 
@@ -892,6 +3158,7 @@ async def add_player(interaction: discord.Interaction, user: discord.Member,
                   description="Remove a player from your team")
 async def remove_player(interaction: discord.Interaction, user: discord.Member,
                         team_name: str):
+    league_data = await bot.leagues.get(interaction.guild)
     guild = interaction.guild
     if not (is_team_captain(interaction.user, guild, team_name)
             or is_league_admin(interaction.user, guild)):
@@ -905,39 +3172,36 @@ async def remove_player(interaction: discord.Interaction, user: discord.Member,
     target_id = user.id
 
     # Check if the team exists
-    if team_name not in bot.league_data.teams:
+    if team_name not in league_data.teams:
         await interaction.response.send_message("This team does not exist!",
                                                 ephemeral=True)
         return
 
     # Check if target is in the team
-    if target_id not in bot.league_data.teams[team_name]['players']:
+    if league_data.player_teams.get(target_id) != team_name:
         await interaction.response.send_message(
             "This player is not in your team!", ephemeral=True)
         return
 
     # Check if the player is the captain
-    is_captain = target_id == bot.league_data.teams[team_name]['captain_id']
+    is_captain = target_id == league_data.teams[team_name].captain_id
 
-    # Remove player
-    bot.league_data.teams[team_name]['players'].remove(target_id)
-    del bot.league_data.player_teams[target_id]
+    # Remove player (also drops captain status if they were the captain)
+    league_data.remove_player(team_name, target_id)
 
-    # If the player was a captain, remove captain status
+    # Remove the team role, and the captain roles if the player was the
+    # captain, in one edit
+    await interaction.response.defer(ephemeral=True)
+    roles = [bot.roles.get(guild, team_name)]
     if is_captain:
-        del bot.league_data.team_captains[target_id]
-        # Remove captain role
-        captain_role = discord.utils.get(guild.roles,
-                                         name=f"{team_name} Captain")
-        if captain_role and captain_role in user.roles:
-            await user.remove_roles(captain_role)
-
-    # Remove the team role from the player
-    role = discord.utils.get(interaction.guild.roles, name=team_name)
-    if role and role in user.roles:
-        await user.remove_roles(role)
+        roles += [
+            bot.roles.get(guild, f"{team_name} Captain"),
+            bot.roles.get(guild, "Captain")
+        ]
+    await edit_member_roles(
+        {user: ((), [role for role in roles if role is not None])})
 
-    bot.league_data.save_data()
+    await league_data.save_data()
 
     embed = discord.Embed(
         title="Player Removed",
@@ -949,7 +3213,7 @@ async def remove_player(interaction: discord.Interaction, user: discord.Member,
                         value="Player was also removed as team captain.",
                         inline=False)
 
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 
 @bot.tree.command(
@@ -957,6 +3221,7 @@ async def remove_player(interaction: discord.Interaction, user: discord.Member,
     description="Schedule a match between two teams (Admin only)")
 async def schedule_match(interaction: discord.Interaction, team1: str,
                          team2: str):
+    league_data = await bot.leagues.get(interaction.guild)
     guild = interaction.guild
     if not is_league_admin(interaction.user, guild):
         embed = discord.Embed(
@@ -967,48 +3232,51 @@ async def schedule_match(interaction: discord.Interaction, team1: str,
         return
 
     # Check if teams exist
-    if team1 not in bot.league_data.teams or team2 not in bot.league_data.teams:
+    if team1 not in league_data.teams or team2 not in league_data.teams:
         await interaction.response.send_message(
             "One or both teams don't exist!", ephemeral=True)
         return
 
     # Create and show the modal
-    modal = ScheduleMatchModal(bot.league_data, team1, team2)
+    modal = ScheduleMatchModal(league_data, team1, team2)
     await interaction.response.send_modal(modal)
 
 
 @bot.tree.command(name="list_matches",
                   description="List all scheduled matches")
 async def list_matches(interaction: discord.Interaction):
-    bot.league_data.cursor.execute("""
-        SELECT match_id, team1_name, team2_name, scheduled_time, status 
-        FROM scheduled_matches 
-        WHERE status = 'scheduled'
-    """)
-    matches = bot.league_data.cursor.fetchall()
-
-    if not matches:
-        await interaction.response.send_message(
-            "No matches are currently scheduled!", ephemeral=True)
-        return
-
-    embed = discord.Embed(title="Scheduled Matches",
-                          color=discord.Color.blue())
-
-    for match in matches:
-        match_id, team1, team2, scheduled_time, status = match
-        embed.add_field(
-            name=f"Match #{match_id}",
-            value=
-            f"{team1} vs {team2}\nTime: {scheduled_time}\nStatus: {status}",
-            inline=False)
+    league_data = await bot.leagues.get(interaction.guild)
+
+    async def fetch_page(after_key, limit):
+        return await league_data.fetchall(SCHEDULED_MATCHES_PAGE_QUERY,
+                                          (*after_key, limit))
+
+    def render_page(matches, page):
+        embed = discord.Embed(title="Scheduled Matches",
+                              color=discord.Color.blue())
+        for match in matches:
+            match_id, team1, team2, scheduled_time, status = match
+            embed.add_field(
+                name=f"Match #{match_id}",
+                value=
+                f"{team1} vs {team2}\nTime: {scheduled_time}\nStatus: {status}",
+                inline=False)
+        embed.set_footer(text=f"Page {page + 1}")
+        return embed
 
-    await interaction.response.send_message(embed=embed)
+    view = PaginatedView(fetch_page,
+                         lambda match: (match[3], match[0]),
+                         render_page, ('', 0),
+                         embed_cache=bot.embeds,
+                         cache_key=(interaction.guild_id, 'list_matches'),
+                         version=league_data.versions['matches'])
+    await view.start(interaction, "No matches are currently scheduled!")
 
 
 @bot.tree.command(name="set_score",
                   description="Submit match score (Admin only)")
 async def set_score(interaction: discord.Interaction, match_id: int):
+    league_data = await bot.leagues.get(interaction.guild)
     guild = interaction.guild
     if not is_league_admin(interaction.user, guild):
         embed = discord.Embed(
@@ -1019,30 +3287,34 @@ async def set_score(interaction: discord.Interaction, match_id: int):
         return
 
     # Fetch match info
-    bot.league_data.cursor.execute(
-        "SELECT team1_name, team2_name FROM scheduled_matches WHERE match_id = ?",
-        (match_id, ))
-    match = bot.league_data.cursor.fetchone()
+    match = await league_data.fetchone(MATCH_TEAMS_QUERY, (match_id, ))
     if not match:
         await interaction.response.send_message(
             "Match not found! Please use /list_matches to see valid match IDs.",
             ephemeral=True)
         return
 
+    team1_name, team2_name, status = match
+    if status == 'completed':
+        await interaction.response.send_message(
+            f"Match #{match_id} has already been reported!", ephemeral=True)
+        return
+
     # Create and show the modal
-    modal = ScoreSubmissionModal(bot.league_data, match_id, interaction)
+    modal = ScoreSubmissionModal(league_data, bot.member_names, match_id,
+                                 team1_name, team2_name, interaction)
     await interaction.response.send_modal(modal)
 
 
 @bot.command(name="stats")
 async def stats(ctx, user: discord.Member):
+    league_data = await bot.leagues.get(ctx.guild)
     user_id = user.id
 
     # Query the database directly for player stats
-    bot.league_data.cursor.execute(
+    stats_row = await league_data.fetchone(
         "SELECT goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves FROM player_stats WHERE player_id = ?",
         (user_id, ))
-    stats_row = bot.league_data.cursor.fetchone()
 
     if not stats_row:
         await ctx.send(f"{user.mention} has no stats yet!")
@@ -1052,7 +3324,7 @@ async def stats(ctx, user: discord.Member):
     goals, assists, saves, cl_goals, cl_assists, cl_saves = stats_row
 
     # Get player's team
-    team_name = bot.league_data.player_teams.get(user_id, "No team")
+    team_name = league_data.player_teams.get(user_id, "No team")
 
     embed = discord.Embed(title=f"Player Stats - {user.name}",
                           color=discord.Color.blue())
@@ -1083,46 +3355,86 @@ async def stats(ctx, user: discord.Member):
     embed.add_field(name="Total Assists", value=str(total_assists))
     embed.add_field(name="Total Saves", value=str(total_saves))
 
+    # Recent form, newest match first
+    form_rows = await league_data.fetchall(PLAYER_FORM_QUERY,
+                                           (user_id, FORM_MATCHES))
+    if form_rows:
+        embed.add_field(
+            name=f"Last {len(form_rows)} Matches",
+            value="\n".join(
+                f"#{match_id} {team}{' (CL)' if competition == 'champions_league' else ''}: {goals}/{assists}/{saves}"
+                for match_id, competition, team, goals, assists, saves in
+                form_rows),
+            inline=False)
+
     await ctx.send(embed=embed)
 
 
 @bot.tree.command(name="list_teams",
                   description="List all teams in the league")
 async def list_teams(interaction: discord.Interaction):
-    if not bot.league_data.teams:
-        await interaction.response.send_message(
-            "No teams have been created yet!", ephemeral=True)
-        return
-
-    embed = discord.Embed(title="League Teams", color=discord.Color.blue())
-    for team_name, team_data in bot.league_data.teams.items():
-        embed.add_field(name=team_name,
-                        value=f"Captain: <@{team_data['captain_id']}>",
-                        inline=False)
+    league_data = await bot.leagues.get(interaction.guild)
+
+    async def fetch_page(after_key, limit):
+        return await league_data.fetchall(TEAMS_PAGE_QUERY, (after_key, limit))
+
+    def render_page(teams, page):
+        embed = discord.Embed(title="League Teams", color=discord.Color.blue())
+        for team_name, captain_id in teams:
+            embed.add_field(name=team_name,
+                            value=f"Captain: <@{captain_id}>",
+                            inline=False)
+        embed.set_footer(text=f"Page {page + 1}")
+        return embed
 
-    await interaction.response.send_message(embed=embed)
+    view = PaginatedView(fetch_page,
+                         lambda team: team[0],
+                         render_page,
+                         '',
+                         embed_cache=bot.embeds,
+                         cache_key=(interaction.guild_id, 'list_teams'),
+                         version=league_data.versions['teams'])
+    await view.start(interaction, "No teams have been created yet!")
 
 
 @bot.tree.command(name="list_players",
                   description="List all players in a team")
 async def list_players(interaction: discord.Interaction, team_name: str):
-    if team_name not in bot.league_data.teams:
+    league_data = await bot.leagues.get(interaction.guild)
+    if team_name not in league_data.teams:
         await interaction.response.send_message("This team does not exist!",
                                                 ephemeral=True)
         return
 
-    players = bot.league_data.teams[team_name]['players']
-    embed = discord.Embed(title=f"Players in {team_name}",
-                          color=discord.Color.blue())
-    for player_id in players:
-        embed.add_field(name="Player", value=f"<@{player_id}>", inline=False)
+    async def fetch_page(after_key, limit):
+        return await league_data.fetchall(TEAM_PLAYERS_PAGE_QUERY,
+                                          (team_name, after_key, limit))
+
+    def render_page(players, page):
+        embed = discord.Embed(title=f"Players in {team_name}",
+                              color=discord.Color.blue())
+        for _, player_id in players:
+            embed.add_field(name="Player",
+                            value=f"<@{player_id}>",
+                            inline=False)
+        embed.set_footer(text=f"Page {page + 1}")
+        return embed
 
-    await interaction.response.send_message(embed=embed)
+    view = PaginatedView(fetch_page,
+                         lambda player: player[0],
+                         render_page,
+                         -1,
+                         embed_cache=bot.embeds,
+                         cache_key=(interaction.guild_id, 'list_players',
+                                    team_name),
+                         version=league_data.versions['teams'])
+    await view.start(interaction, "This team has no players!")
 
 
 @bot.tree.command(name="delete_team",
                   description="Delete a team from the league")
 async def delete_team(interaction: discord.Interaction, team_name: str):
+    league_data = await bot.leagues.get(interaction.guild)
     guild = interaction.guild
     if not is_league_admin(interaction.user, guild):
         embed = discord.Embed(
@@ -1131,49 +3443,28 @@ async def delete_team(interaction: discord.Interaction, team_name: str):
             color=discord.Color.red())
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
-    if team_name not in bot.league_data.teams:
+    if team_name not in league_data.teams:
         await interaction.response.send_message("This team does not exist!",
                                                 ephemeral=True)
         return
 
     # Remove team from all relevant dictionaries
-    del bot.league_data.teams[team_name]
-    to_remove = [
-        player_id for player_id, tname in bot.league_data.player_teams.items()
-        if tname == team_name
-    ]
-    for player_id in to_remove:
-        del bot.league_data.player_teams[player_id]
-    to_remove_captains = [
-        captain_id
-        for captain_id, tname in bot.league_data.team_captains.items()
-        if tname == team_name
-    ]
-    for captain_id in to_remove_captains:
-        del bot.league_data.team_captains[captain_id]
-
-    # Remove Discord roles for the team and captain
-    guild = interaction.guild
-    team_role = discord.utils.get(guild.roles, name=team_name)
-    captain_role = discord.utils.get(guild.roles, name=f"{team_name} Captain")
-    Captain_global_role = discord.utils.get(guild.roles, name="Captain")
-    if Captain_global_role:
-        for member in Captain_global_role.members:
-            await member.remove_roles(Captain_global_role)
-        await Captain_global_role.delete()
-
-    if team_role:
-        for member in team_role.members:
-            await member.remove_roles(team_role)
-        await team_role.delete()
-
-    if captain_role:
-        for member in captain_role.members:
-            await member.remove_roles(captain_role)
-        await captain_role.delete()
-
-    bot.league_data.save_data()
-    await interaction.response.send_message(
+    captain = guild.get_member(league_data.teams[team_name].captain_id)
+    league_data.delete_team(team_name)
+    await interaction.response.defer(ephemeral=True)
+
+    # Deleting the team and captain roles takes them off every member; only
+    # this team's captain loses the shared @Captain role
+    team_role = bot.roles.get(guild, team_name)
+    captain_role = bot.roles.get(guild, f"{team_name} Captain")
+    captain_global_role = bot.roles.get(guild, "Captain")
+    if captain and captain_global_role:
+        await edit_member_roles({captain: ((), (captain_global_role, ))})
+    await asyncio.gather(*(role.delete() for role in (team_role, captain_role)
+                           if role))
+
+    await league_data.save_data()
+    await interaction.followup.send(
         f"Team '{team_name}' and its roles have been deleted!", ephemeral=True)
 
 
@@ -1181,6 +3472,7 @@ async def delete_team(interaction: discord.Interaction, team_name: str):
                   description="Change the captain of a team")
 async def update_captain(interaction: discord.Interaction, team_name: str,
                          new_captain: discord.Member):
+    league_data = await bot.leagues.get(interaction.guild)
     guild = interaction.guild
     if not (is_team_captain(interaction.user, guild, team_name)
             or is_league_admin(interaction.user, guild)):
@@ -1193,49 +3485,34 @@ async def update_captain(interaction: discord.Interaction, team_name: str,
         return
 
     new_captain_id = new_captain.id
-    if new_captain_id not in bot.league_data.teams[team_name]['players']:
+    if league_data.player_teams.get(new_captain_id) != team_name:
         await interaction.response.send_message(
             "The new captain must be a player in the team!", ephemeral=True)
         return
 
     # Get the old captain's ID
-    old_captain_id = bot.league_data.teams[team_name]['captain_id']
+    old_captain_id = league_data.teams[team_name].captain_id
     old_captain = guild.get_member(old_captain_id)
 
     # Get the captain role
-    captain_role = discord.utils.get(guild.roles, name=f"{team_name} Captain")
+    captain_role = bot.roles.get(guild, f"{team_name} Captain")
     if not captain_role:
         await interaction.response.send_message(
             "Error: Captain role not found!", ephemeral=True)
         return
 
-    # Remove captain role from old captain
-    if old_captain and captain_role in old_captain.roles:
-        await old_captain.remove_roles(captain_role)
-
-    # Add captain role to new captain
-    await new_captain.add_roles(captain_role)
-
-    # Ensure the @Captain role exists and assign it to the new captain
-    captain_global_role = discord.utils.get(interaction.guild.roles,
-                                            name="Captain")
-    if not captain_global_role:
-        captain_global_role = await interaction.guild.create_role(
-            name="Captain")
-    await new_captain.add_roles(captain_global_role)
-
-    # Remove @Captain role from the old captain
-    if old_captain and captain_global_role in old_captain.roles:
-        await old_captain.remove_roles(captain_global_role)
+    # Move the team captain and @Captain roles from the old captain to the
+    # new one, both edits running together
+    await interaction.response.defer(ephemeral=True)
+    captain_roles = (captain_role, await get_captain_global_role(guild))
+    changes = {new_captain: (captain_roles, ())}
+    if old_captain and old_captain != new_captain:
+        changes[old_captain] = ((), captain_roles)
+    await edit_member_roles(changes)
 
     # Update database
-    bot.league_data.teams[team_name]['captain_id'] = new_captain_id
-    # Remove old captain from team_captains
-    if old_captain_id in bot.league_data.team_captains:
-        del bot.league_data.team_captains[old_captain_id]
-    # Add new captain to team_captains
-    bot.league_data.team_captains[new_captain_id] = team_name
-    bot.league_data.save_data()
+    league_data.set_captain(team_name, new_captain_id)
+    await league_data.save_data()
 
     embed = discord.Embed(
         title="Captain Updated",
@@ -1245,30 +3522,35 @@ async def update_captain(interaction: discord.Interaction, team_name: str,
     if old_captain:
         embed.add_field(name="Previous Captain", value=f"<@{old_captain_id}>")
 
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 
 @bot.tree.command(name="view_league_stats",
                   description="View overall league statistics")
 async def view_league_stats(interaction: discord.Interaction):
-    total_goals = sum(stats['goals']
-                      for stats in bot.league_data.player_stats.values())
-    total_assists = sum(stats['assists']
-                        for stats in bot.league_data.player_stats.values())
-    total_saves = sum(stats['saves']
-                      for stats in bot.league_data.player_stats.values())
-
-    embed = discord.Embed(title="League Statistics",
-                          color=discord.Color.blue())
-    embed.add_field(name="Total Goals", value=str(total_goals))
-    embed.add_field(name="Total Assists", value=str(total_assists))
-    embed.add_field(name="Total Saves", value=str(total_saves))
+    league_data = await bot.leagues.get(interaction.guild)
+
+    def build():
+        # Totals are kept up to date as results come in
+        totals = league_data.stats_totals
+        total_goals = totals['goals']
+        total_assists = totals['assists']
+        total_saves = totals['saves']
+
+        embed = discord.Embed(title="League Statistics",
+                              color=discord.Color.blue())
+        embed.add_field(name="Total Goals", value=str(total_goals))
+        embed.add_field(name="Total Assists", value=str(total_assists))
+        embed.add_field(name="Total Saves", value=str(total_saves))
+        return embed
 
+    embed = bot.embeds.get_or_build(
+        (interaction.guild_id, 'view_league_stats'),
+        league_data.versions['stats'], build)
     await interaction.response.send_message(embed=embed)
 
 
-@bot.tree.command(name="help", description="Display all available commands")
-async def help_command(interaction: discord.Interaction):
+def build_help_embed():
     embed = discord.Embed(
         title="Bot Commands",
         description="Here are all the available commands for the League Bot:",
@@ -1286,7 +3568,11 @@ async def help_command(interaction: discord.Interaction):
          "Schedule a match between two teams (Captain/Admin only)"),
         ("list_matches", "List all scheduled matches"),
         ("set_score <match_id>", "Submit match score for a scheduled match"),
-        ("stats <@user>", "View player statistics"),
+        ("import_results <file>",
+         "Import match results from a CSV or JSON file (admin only)"),
+        ("stats <@user>", "View player statistics and recent form"),
+        ("match_stats <match_id>",
+         "View every player's stats for a reported match"),
         ("list_teams", "List all teams in the league"),
         ("list_players <team_name>", "List all players in a specific team"),
         ("delete_team <team_name>",
@@ -1294,9 +3580,20 @@ async def help_command(interaction: discord.Interaction):
         ("update_captain <team_name> <@user>",
          "Change the captain of a team (Captain/Admin only)"),
         ("view_league_stats", "View overall league statistics"),
+        ("leaderboard <stat> [competition]",
+         "Top 10 players by goals, assists, saves or total"),
         ("sync_commands", "Force sync all slash commands (admin only)"),
-        ("initiate_league", "Initialize the league data (admin only)"),
-        ("help", "Display this help message")
+        ("set_announcement_channel <#channel>",
+         "Post this server's league announcements in a channel (admin only)"),
+        ("initiate_league [start_date] [days_between_matchdays] [time_slots]",
+         "Initialize the league and schedule a double round-robin (admin only)"
+         ),
+        ("rebuild_stats",
+         "Recompute player stats and standings from match history (admin only)"
+         ),
+        ("metrics",
+         "Show command latency and database and Discord API usage (admin only)"
+         ), ("help", "Display this help message")
     ]
 
     for cmd, desc in commands:
@@ -1306,10 +3603,217 @@ async def help_command(interaction: discord.Interaction):
         text=
         "Note: Some commands require captain or admin permissions. Use /list_matches to find match IDs for /set_score."
     )
+    return embed
+
+
+# The help text never changes, so its embed is built once
+HELP_EMBED = build_help_embed()
+
+
+@bot.tree.command(name="leaderboard",
+                  description="Top players by goals, assists, saves or total")
+@app_commands.choices(stat=[
+    app_commands.Choice(name="Goals", value="goals"),
+    app_commands.Choice(name="Assists", value="assists"),
+    app_commands.Choice(name="Saves", value="saves"),
+    app_commands.Choice(name="Total (goals + assists + saves)", value="total")
+],
+                      competition=[
+                          app_commands.Choice(name="League", value="league"),
+                          app_commands.Choice(name="Champions League",
+                                              value="champions_league")
+                      ])
+async def leaderboard(interaction: discord.Interaction,
+                      stat: app_commands.Choice[str],
+                      competition: Optional[app_commands.Choice[str]] = None):
+    league_data = await bot.leagues.get(interaction.guild)
+    competition_value = competition.value if competition else "league"
+    cache_key = (interaction.guild_id, 'leaderboard', competition_value,
+                 stat.value)
+    version = league_data.versions['stats']
+
+    embed = bot.embeds.get(cache_key, version)
+    if embed is None:
+        rows = await league_data.fetchall(
+            leaderboard_query(competition_value, stat.value),
+            (LEADERBOARD_SIZE, ))
+        league_name = ("Champions League" if competition_value
+                       == "champions_league" else "League")
+        embed = discord.Embed(title=f"{league_name} Leaderboard - {stat.name}",
+                              color=discord.Color.gold())
+        embed.description = "\n".join(
+            f"**{rank}.** <@{player_id}> - {value}" for rank, (
+                player_id,
+                value) in enumerate(rows, start=1)) or "No stats recorded yet!"
+        bot.embeds.put(cache_key, version, embed)
 
     await interaction.response.send_message(embed=embed)
 
 
+@bot.tree.command(
+    name="import_results",
+    description="Import match results from a CSV or JSON file (admin only)")
+async def import_results(interaction: discord.Interaction,
+                         file: discord.Attachment):
+    if not is_league_admin(interaction.user, interaction.guild):
+        embed = discord.Embed(
+            title="Permission Denied",
+            description="Only a League Admin/Admin can import match results.",
+            color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    league_data = await bot.leagues.get(interaction.guild)
+
+    # Validate the rows as they are read, looking up the matches of
+    # IMPORT_LOOKUP_CHUNK rows at a time; nothing is written unless every
+    # row is valid
+    results, errors, seen = [], [], set()
+
+    async def validate(rows):
+        match_ids = set()
+        for _, record in rows:
+            try:
+                match_ids.add(int(record['match_id']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        matches = await league_data.read(league_data.fetch_matches, match_ids)
+        for number, record in rows:
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError("not a result record")
+                result = parse_result_record(record, matches,
+                                             league_data.teams)
+                if result[0] in seen:
+                    raise ValueError(
+                        f"match #{result[0]} appears more than once")
+                seen.add(result[0])
+                results.append(result)
+            except ValueError as e:
+                errors.append(f"Row {number}: {e}")
+
+    row_count, rows = 0, []
+    try:
+        for row in read_result_records(file.filename, await file.read()):
+            row_count += 1
+            rows.append(row)
+            if len(rows) == IMPORT_LOOKUP_CHUNK:
+                await validate(rows)
+                rows = []
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        await interaction.followup.send(f"Could not read {file.filename}: {e}",
+                                        ephemeral=True)
+        return
+    if not row_count:
+        await interaction.followup.send(f"{file.filename} has no results!",
+                                        ephemeral=True)
+        return
+    if rows:
+        await validate(rows)
+    if errors:
+        shown = "\n".join(errors[:MAX_IMPORT_ERRORS])
+        more = (f"\n...and {len(errors) - MAX_IMPORT_ERRORS} more"
+                if len(errors) > MAX_IMPORT_ERRORS else "")
+        await interaction.followup.send(
+            f"Import aborted, {len(errors)} invalid rows:\n{shown}{more}",
+            ephemeral=True)
+        return
+
+    # Stats, results, match status and standings for the whole file in one
+    # transaction
+    try:
+        player_rows = await league_data.transaction(
+            league_data.record_match_results, results)
+    except (MatchAlreadyReported, MatchNotFound) as e:
+        await interaction.followup.send(f"Import aborted: {e}", ephemeral=True)
+        return
+    except Exception as e:
+        log.exception("Importing results from %s failed", file.filename)
+        await interaction.followup.send(
+            f"Error importing results, nothing was imported: {str(e)}",
+            ephemeral=True)
+        return
+    for rows, (_, team1_name, team2_name, score1, score2, _, _, _, _,
+               is_champions_league) in zip(player_rows, results):
+        league_data.apply_match_result(rows, team1_name, team2_name, score1,
+                                       score2, is_champions_league)
+
+    # One announcement for the whole batch
+    lines = [
+        f"{'Champions League' if is_champions_league else 'League'} #{match_id}: "
+        f"{team1_name} {score1} - {score2} {team2_name}"
+        for (match_id, team1_name, team2_name, score1, score2, _, _, _, _,
+             is_champions_league) in results
+    ]
+    description = ""
+    for index, line in enumerate(lines):
+        if len(description) + len(line) > 3900:
+            description += f"...and {len(lines) - index} more"
+            break
+        description += line + "\n"
+    bot.announcements.announce_in(
+        interaction.guild, league_data,
+        discord.Embed(title=f"{len(results)} Match Results Announced!",
+                      description=description,
+                      color=discord.Color.green()))
+
+    await interaction.followup.send(f"Imported {len(results)} results.",
+                                    ephemeral=True)
+
+
+@bot.tree.command(name="match_stats",
+                  description="View every player's stats for a reported match")
+async def match_stats(interaction: discord.Interaction, match_id: int):
+    league_data = await bot.leagues.get(interaction.guild)
+    rows = await league_data.fetchall(MATCH_STATS_QUERY, (match_id, ))
+    if not rows:
+        await interaction.response.send_message(
+            f"No player stats recorded for match #{match_id}!", ephemeral=True)
+        return
+
+    competition = rows[0][1]
+    league_name = ("Champions League"
+                   if competition == "champions_league" else "League")
+    embed = discord.Embed(title=f"{league_name} Match #{match_id} Stats",
+                          color=discord.Color.blue())
+    teams = {}
+    for player_id, _, team, goals, assists, saves in rows:
+        teams.setdefault(
+            team, []).append(f"<@{player_id}>: {goals}/{assists}/{saves}")
+    for team, lines in teams.items():
+        embed.add_field(name=team, value="\n".join(lines), inline=False)
+    embed.set_footer(text="goals/assists/saves")
+
+    await interaction.response.send_message(embed=embed)
+
+
+@bot.tree.command(name="help", description="Display all available commands")
+async def help_command(interaction: discord.Interaction):
+    await interaction.response.send_message(embed=HELP_EMBED)
+
+
+@bot.tree.command(
+    name="set_announcement_channel",
+    description=
+    "Post this server's league announcements in a channel (admin only)")
+async def set_announcement_channel(interaction: discord.Interaction,
+                                   channel: discord.TextChannel):
+    league_data = await bot.leagues.get(interaction.guild)
+    if not is_league_admin(interaction.user, interaction.guild):
+        embed = discord.Embed(
+            title="Permission Denied",
+            description=
+            "Only a League Admin/Admin can set the announcement channel.",
+            color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    await league_data.set_announcement_channel(channel.id)
+    await interaction.response.send_message(
+        f"League announcements will be posted in {channel.mention}.",
+        ephemeral=True)
+
+
 # Manual sync command for admins
 @bot.tree.command(name="sync_commands",
                   description="Force sync all slash commands (admin only)")
@@ -1320,11 +3824,11 @@ async def sync_commands(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
 
         # Sync commands globally
-        await bot.tree.sync()
+        await bot.sync_command_tree(force=True)
 
         # Sync commands for each guild
         for guild in bot.guilds:
-            await bot.tree.sync(guild=guild)
+            await bot.sync_command_tree(guild, force=True)
 
         embed = discord.Embed(
             title="Commands Synced",
@@ -1344,14 +3848,22 @@ async def sync_commands(interaction: discord.Interaction):
     description=
     "Initialize the Champions League data (admin only) with top 4 teams from each division"
 )
-async def initiate_champions_league(interaction: discord.Interaction):
+async def initiate_champions_league(interaction: discord.Interaction,
+                                    seed: Optional[int] = None):
+    league_data = await bot.leagues.get(interaction.guild)
+    # The draw is reproducible: the seed used is shown with the groups
+    if seed is None:
+        seed = random.randrange(2**32)
+
     # First, clear any existing champions league data
-    bot.league_data.cursor.execute("DELETE FROM champions_league_teams")
-    bot.league_data.cursor.execute("DELETE FROM champions_league_standings")
-    bot.league_data.conn.commit()
+    def clear_champions_league(cursor):
+        cursor.execute("DELETE FROM champions_league_teams")
+        cursor.execute("DELETE FROM champions_league_standings")
+        league_data.start_season(cursor, 'champions_league')
+
+    await league_data.transaction(clear_champions_league)
 
-    # Get the top 4 teams from each division
-    divisions = ["Division 1", "Division 2", "Division 3", "Division 4"]
+    # Get the top teams from each division
     qualified_teams = []
 
     embed = discord.Embed(
@@ -1360,25 +3872,17 @@ async def initiate_champions_league(interaction: discord.Interaction):
         "Top 4 teams from each division that qualified for Champions League!",
         color=discord.Color.gold())
 
-    # Get top 4 teams from each division
-    for division in divisions:
-        bot.league_data.cursor.execute(
-            """
-            SELECT t.team_name, s.wins, s.losses, s.draws 
-            FROM teams t
-            JOIN standings s ON t.team_name = s.team_name
-            WHERE t.division = ?
-            ORDER BY s.wins DESC, s.losses ASC, s.draws DESC
-            LIMIT 4
-        """, (division, ))
-
-        division_top_teams = bot.league_data.cursor.fetchall()
-        qualified_teams.extend(division_top_teams)
+    # Get top 4 teams from each division; a team's pot is its rank
+    for division in CHAMPIONS_LEAGUE_DIVISIONS:
+        division_top_teams = league_data.standings.page(
+            division, 0, CHAMPIONS_LEAGUE_QUALIFIERS)
+        qualified_teams.extend((team_name, division, rank)
+                               for rank, team_name, _ in division_top_teams)
 
         # Add to embed
         team_list = [
-            f"{team[0]} ({team[1]}W-{team[2]}L-{team[3]}D)"
-            for team in division_top_teams
+            f"{team_name} ({row['points']} pts, {row['wins']}W-{row['losses']}L-{row['draws']}D)"
+            for _, team_name, row in division_top_teams
         ]
         embed.add_field(
             name=f"{division} Qualifiers",
@@ -1388,15 +3892,19 @@ async def initiate_champions_league(interaction: discord.Interaction):
     # Send the initial qualification message
     await interaction.response.send_message(embed=embed)
 
-    # Shuffle the qualified teams for random group assignment
-    random.shuffle(qualified_teams)
-
-    # Assign teams to Champions League groups
+    # Draw the qualified teams into groups, seeded by pot and kept apart by
+    # division. The draw is CPU bound, so it runs off the event loop.
+    try:
+        drawn_groups = await asyncio.get_running_loop().run_in_executor(
+            None, draw_groups, qualified_teams, CHAMPIONS_LEAGUE_GROUPS,
+            random.Random(seed))
+    except DrawImpossible:
+        await interaction.followup.send(
+            "The qualified teams cannot be drawn into groups!", ephemeral=True)
+        return
     groups = {
-        "Group A": qualified_teams[0:4],
-        "Group B": qualified_teams[4:8],
-        "Group C": qualified_teams[8:12],
-        "Group D": qualified_teams[12:16]
+        f"Group {chr(ord('A') + index)}": group_teams
+        for index, group_teams in enumerate(drawn_groups)
     }
 
     # Create Champions League groups embed
@@ -1404,42 +3912,37 @@ async def initiate_champions_league(interaction: discord.Interaction):
         title="Champions League Groups",
         description="Teams have been assigned to Champions League groups!",
         color=discord.Color.blue())
-
-    # Add teams to champions_league_teams and champions_league_standings tables
-    for group_name, group_teams in groups.items():
-        group_team_names = []
-
-        for team_data in group_teams:
-            team_name = team_data[0]
-            group_team_names.append(team_name)
-
-            # Get team data from regular league
-            bot.league_data.cursor.execute(
-                "SELECT captain_id, players FROM teams WHERE team_name = ?",
-                (team_name, ))
-            team_info = bot.league_data.cursor.fetchone()
-
-            if team_info:
-                captain_id, players = team_info
-
-                # Add team to champions_league_teams table
-                bot.league_data.cursor.execute(
-                    "INSERT INTO champions_league_teams (team_name, captain_id, players, division) VALUES (?, ?, ?, ?)",
-                    (team_name, captain_id, players, group_name))
-
-                # Initialize team in champions_league_standings
-                bot.league_data.cursor.execute(
-                    "INSERT INTO champions_league_standings (team_name, wins, losses, draws) VALUES (?, 0, 0, 0)",
-                    (team_name, ))
-
+    groups_embed.set_footer(text=f"Draw seed: {seed}")
+
+    # Add teams to champions_league_teams and champions_league_standings
+    # tables; captains are copied from the regular league teams and the
+    # roster stays in team_players
+    group_rows = [(group_name, team_name)
+                  for group_name, group_teams in groups.items()
+                  for team_name in group_teams]
+
+    def insert_groups(cursor):
+        cursor.executemany(
+            """INSERT INTO champions_league_teams (team_name, captain_id, division)
+            SELECT team_name, captain_id, ? FROM teams WHERE team_name = ?""",
+            group_rows)
+        cursor.executemany(
+            "INSERT INTO champions_league_standings (team_name) VALUES (?)",
+            [(team_name, ) for _, team_name in group_rows])
+
+    await league_data.transaction(insert_groups)
+    league_data.champions_league_standings.load(
+        (team_name, group_name, 0, 0, 0, 0, 0, 0)
+        for group_name, team_name in group_rows)
+    league_data.bump('standings')
+
+    for group_name, group_team_names in groups.items():
         # Add group to embed
         groups_embed.add_field(name=group_name,
                                value="\n".join(group_team_names)
                                if group_team_names else "No teams",
                                inline=False)
 
-    bot.league_data.conn.commit()
-
     # Send the groups organization message
     await interaction.followup.send(embed=groups_embed)
     await interaction.followup.send(
@@ -1451,9 +3954,44 @@ async def initiate_champions_league(interaction: discord.Interaction):
     description=
     "Initialize the league data (admin only), set the leagues as 4 divisions, 8 teams each"
 )
-async def initiate_league(interaction: discord.Interaction):
+async def initiate_league(interaction: discord.Interaction,
+                          start_date: Optional[str] = None,
+                          days_between_matchdays: int = MATCHDAY_SPACING_DAYS,
+                          time_slots: str = MATCH_TIME_SLOTS):
+    league_data = await bot.leagues.get(interaction.guild)
+    if not is_league_admin(interaction.user, interaction.guild):
+        embed = discord.Embed(
+            title="Permission Denied",
+            description="Only a League Admin/Admin can initiate the league.",
+            color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    # Fixture options: first match day (default tomorrow), spacing and the
+    # comma separated kick-off times used within a match day
+    try:
+        first_day = (datetime.strptime(start_date, "%Y-%m-%d").date() if
+                     start_date else datetime.now().date() + timedelta(days=1))
+    except ValueError:
+        await interaction.response.send_message(
+            "Invalid start date format! Please use YYYY-MM-DD", ephemeral=True)
+        return
+    try:
+        slots = [
+            datetime.strptime(slot.strip(), "%H:%M").time()
+            for slot in time_slots.split(',') if slot.strip()
+        ]
+    except ValueError:
+        slots = []
+    if (not slots or days_between_matchdays < 1
+            or days_between_matchdays > MAX_MATCHDAY_SPACING_DAYS):
+        await interaction.response.send_message(
+            f"Invalid fixture options! Use HH:MM time slots separated by commas and 1 to {MAX_MATCHDAY_SPACING_DAYS} days between match days.",
+            ephemeral=True)
+        return
+
     # Randomize teams and assign them to divisions
-    teams = list(bot.league_data.teams.keys())
+    teams = list(league_data.teams.keys())
 
     divisions = {
         "Division 1": teams[:8],
@@ -1462,6 +4000,22 @@ async def initiate_league(interaction: discord.Interaction):
         "Division 4": teams[24:32]
     }
 
+    # Build the fixture list before anything is changed or announced
+    try:
+        fixtures = generate_fixtures(divisions, first_day,
+                                     days_between_matchdays, slots)
+    except OverflowError:
+        await interaction.response.send_message(
+            "Invalid start date! The season would end after the year 9999.",
+            ephemeral=True)
+        return
+    # The previous season's generated fixtures are the ones scheduled since
+    # it started between two teams of the same division
+    previous_divisions = {
+        team_name: team.division
+        for team_name, team in league_data.teams.items() if team.division
+    }
+
     embed = discord.Embed(title="League Divisions",
                           description="Teams have been assigned to divisions!",
                           color=discord.Color.green())
@@ -1477,46 +4031,173 @@ async def initiate_league(interaction: discord.Interaction):
     # Update the database with the divisions
     for division_name, division_teams in divisions.items():
         for team in division_teams:
-            bot.league_data.cursor.execute(
-                "UPDATE teams SET division = ? WHERE team_name = ?",
-                (division_name, team))
-    bot.league_data.conn.commit()
-
-    # Update the standings based on wins, losses, draws
-    for division_name, division_teams in divisions.items():
+            league_data.set_division(team, division_name)
+    await league_data.save_data()
+
+    # Reset the standings, drop the previous season's unplayed fixtures and
+    # schedule the new season in one transaction
+    def start_new_season(cursor):
+        season_start = cursor.execute(
+            "SELECT first_match_id FROM season_starts WHERE competition = 'league'"
+        ).fetchone()
+        stale = []
+        if season_start:
+            for match_id, team1_name, team2_name in cursor.execute(
+                    "SELECT match_id, team1_name, team2_name FROM scheduled_matches WHERE status = 'scheduled' AND match_id >= ?",
+                    season_start).fetchall():
+                division = previous_divisions.get(team1_name)
+                if division and division == previous_divisions.get(team2_name):
+                    stale.append((match_id, ))
+        cursor.executemany("DELETE FROM scheduled_matches WHERE match_id = ?",
+                           stale)
+        cursor.executemany(
+            "UPDATE standings SET wins = 0, losses = 0, draws = 0, goals_for = 0, goals_against = 0, points = 0 WHERE team_name = ?",
+            [(team, ) for division_teams in divisions.values()
+             for team in division_teams])
+        league_data.start_season(cursor, 'league')
+        cursor.executemany(
+            "INSERT INTO scheduled_matches (team1_name, team2_name, scheduled_time, status) VALUES (?, ?, ?, 'scheduled')",
+            fixtures)
+        return len(stale)
+
+    removed = await league_data.transaction(start_new_season)
+    for division_teams in divisions.values():
         for team in division_teams:
-            bot.league_data.cursor.execute(
-                "UPDATE standings SET wins = 0, losses = 0, draws = 0 WHERE team_name = ?",
-                (team, ))
-    bot.league_data.conn.commit()
+            league_data.standings.reset(team)
+    league_data.bump('standings', 'matches')
 
-    await interaction.followup.send("League divisions have been initialized!",
-                                    ephemeral=True)
+    # One summary announcement for the whole fixture list
+    if fixtures:
+        announcement_embed = discord.Embed(
+            title="Season Fixtures Released!",
+            description=
+            f"{len(fixtures)} matches have been scheduled from {fixtures[0][2][:10]} to {max(fixture[2] for fixture in fixtures)[:10]}. Use /list_matches to see them.",
+            color=discord.Color.blue())
+        for division_name, division_teams in divisions.items():
+            if len(division_teams) > 1:
+                announcement_embed.add_field(
+                    name=division_name,
+                    value=
+                    f"{len(division_teams) * (len(division_teams) - 1)} matches",
+                    inline=False)
+        bot.announcements.announce_in(interaction.guild, league_data,
+                                      announcement_embed)
+
+    message = "League divisions have been initialized!"
+    if removed:
+        message += f" {removed} unplayed matches from the previous season were removed."
+    await interaction.followup.send(message, ephemeral=True)
+
+
+@bot.tree.command(
+    name="rebuild_stats",
+    description=
+    "Recompute player stats and standings from the match history (admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+async def rebuild_stats(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    league_data = await bot.leagues.get(interaction.guild)
+
+    started = time.perf_counter()
+    player_count, rows = await league_data.transaction(
+        league_data.rebuild_aggregates)
+    # Results committed after the rebuild are applied on top of this
+    league_data.load_aggregates(*rows)
+    league_data.bump('standings', 'stats')
+    elapsed = time.perf_counter() - started
+
+    _, standings_rows, champions_league_rows = rows
+    await interaction.followup.send(
+        f"Rebuilt stats for {player_count} players and standings for "
+        f"{len(standings_rows) + len(champions_league_rows)} teams in {elapsed:.2f}s.",
+        ephemeral=True)
+
+
+@bot.tree.command(
+    name="metrics",
+    description=
+    "Show command latency and database and Discord API usage (admin only)")
+@app_commands.checks.has_permissions(administrator=True)
+async def view_metrics(interaction: discord.Interaction):
+    commands_rows, rest_rows, rate_limited, rest_total = metrics.summary()
+
+    def duration(seconds):
+        if seconds == float('inf'):
+            return f"> {LATENCY_BUCKETS[-1]:g} s"
+        return f"≤ {seconds * 1000:g} ms"
+
+    prefixes = {'slash': '/', 'prefix': '!', 'modal': ''}
+    command_lines = []
+    for (kind, name, count, p50, p95, failures, statements,
+         sql_seconds) in commands_rows:
+        line = (f"`{prefixes.get(kind, '')}{name}` {count} calls, "
+                f"p50 {duration(p50)}, p95 {duration(p95)}, "
+                f"SQL {statements / count:.1f} stmts "
+                f"{sql_seconds * 1000 / count:.1f} ms per call")
+        if failures:
+            line += f", {failures} failed"
+        command_lines.append(line)
+    rest_lines = [
+        f"`{method} {route}` {count}" +
+        (f" ({failed} failed)" if failed else "")
+        for method, route, count, failed in rest_rows
+    ]
+
+    embed = discord.Embed(title="Bot Metrics", color=discord.Color.blue())
+    embed.add_field(name="Slowest Commands (by p95)",
+                    value="\n".join(command_lines)[:1024] or "No commands yet",
+                    inline=False)
+    embed.add_field(name=f"Discord REST Calls ({rest_total})",
+                    value="\n".join(rest_lines)[:1024] or "No calls yet",
+                    inline=False)
+    embed.add_field(
+        name="Rate Limited (429)",
+        value=", ".join(f"{source}: {count}"
+                        for source, count in sorted(rate_limited.items()))
+        or "None",
+        inline=False)
+    started = datetime.fromtimestamp(
+        metrics.started).strftime("%Y-%m-%d %H:%M")
+    footer = f"Since {started}"
+    if bot._metrics_runner is not None:
+        footer += f" | Full series at http://{METRICS_HOST}:{METRICS_PORT}/metrics"
+    embed.set_footer(text=footer)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 @bot.tree.command(name="view_standings", description="View league standings")
-async def view_standings(interaction: discord.Interaction):
-    # Query with sorting done in SQL
-    bot.league_data.cursor.execute("""
-        SELECT team_name, wins, losses, draws
-        FROM standings
-        ORDER BY wins DESC, losses ASC, draws DESC
-    """)
-    standings = bot.league_data.cursor.fetchall()
-
-    if not standings:
+async def view_standings(interaction: discord.Interaction,
+                         division: Optional[str] = None):
+    league_data = await bot.leagues.get(interaction.guild)
+    if league_data.standings.count(division) == 0:
         await interaction.response.send_message("No standings available!",
                                                 ephemeral=True)
         return
 
-    # Create embed and format standings table
-    embed = discord.Embed(title="League Standings", color=discord.Color.blue())
-    standings_text = "```md\n# Team Name | Wins | Losses | Draws\n"
-    standings_text += "-------------------------------------\n"
-    for team_name, wins, losses, draws in standings:
-        standings_text += f"{team_name} | {wins} | {losses} | {draws}\n"
-    standings_text += "```"
-    embed.description = standings_text
+    def build():
+        # Standings are kept ranked in memory, reading the top is a slice
+        standings = league_data.standings.page(division, 0,
+                                               STANDINGS_PAGE_SIZE)
+
+        # Create embed and format standings table
+        title = f"{division} Standings" if division else "League Standings"
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+        standings_text = "```md\n# | Team Name | W | D | L | GF:GA | GD | Pts\n"
+        standings_text += "-------------------------------------------\n"
+        for rank, team_name, row in standings:
+            goal_difference = row['goals_for'] - row['goals_against']
+            standings_text += (
+                f"{rank} | {team_name} | {row['wins']} | {row['draws']} | "
+                f"{row['losses']} | {row['goals_for']}:{row['goals_against']} | "
+                f"{goal_difference:+d} | {row['points']}\n")
+        standings_text += "```"
+        embed.description = standings_text
+        return embed
+
+    embed = bot.embeds.get_or_build(
+        (interaction.guild_id, 'view_standings', division),
+        league_data.versions['standings'], build)
+    await interaction.response.send_message(embed=embed)
 
 
 # Run the bot
@@ -0,0 +1,43 @@
+# Shared setup for the tests in this directory and the benchmarks in bench/.
+import atexit
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_workdir = None
+
+
+def import_bot():
+    # bot.py needs its channel ids in the environment and opens
+    # league_data.db in the working directory on import, so it is imported
+    # from a scratch directory away from any real league. The directory is
+    # removed at exit, after the bot's leagues are closed.
+    global _workdir
+    if 'bot' in sys.modules:
+        return sys.modules['bot']
+    for name in ("ANNOUNCEMENT_CHANNEL_ID", "RESULTS_CHANNEL_ID",
+                 "ADMIN_CHANNEL_ID", "REPORT_SCORES_CHANNEL_ID"):
+        os.environ.setdefault(name, "0")
+    os.environ.setdefault("METRICS_PORT", "0")
+    _workdir = tempfile.TemporaryDirectory(prefix="rematch-")
+    cwd = os.getcwd()
+    os.chdir(_workdir.name)
+    try:
+        sys.path.insert(0, ROOT)
+        import bot
+    finally:
+        os.chdir(cwd)
+    atexit.register(_cleanup, bot)
+    return bot
+
+
+def scratch_dir():
+    # The directory bot.py was imported in
+    return _workdir.name
+
+
+def _cleanup(bot):
+    bot.bot.leagues.close()
+    _workdir.cleanup()
@@ -0,0 +1,57 @@
+# Champions League draw: uneven divisions must still be drawn quickly and
+# within the pot and division limits.
+import random
+import time
+import unittest
+from collections import Counter
+
+from support import import_bot
+
+# Qualifiers per division (pot = division rank) and groups of a draw whose
+# unbounded backtracking used to run for close to a minute
+DIVISION_SIZES = [8, 8, 8, 6, 6, 2, 1]
+GROUP_COUNT = 8
+SLOW_SEEDS = [2941, 3]
+TIME_LIMIT = 2.0
+
+
+def setUpModule():
+    global bot
+    bot = import_bot()
+
+
+class DrawGroupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.teams = [(f"Division {d} #{rank}", f"Division {d}", rank)
+                      for d, size in enumerate(DIVISION_SIZES, start=1)
+                      for rank in range(1, size + 1)]
+
+    def test_uneven_divisions(self):
+        for seed in SLOW_SEEDS + list(range(50)):
+            started = time.perf_counter()
+            groups = bot.draw_groups(self.teams, GROUP_COUNT,
+                                     random.Random(seed))
+            self.assertLess(time.perf_counter() - started, TIME_LIMIT, seed)
+            self.assertEqual(
+                sorted(team for group in groups for team in group),
+                sorted(team_name for team_name, _, _ in self.teams))
+            self.assertLessEqual(
+                max(map(len, groups)) - min(map(len, groups)), 1)
+            teams = {team_name: team for team_name, *team in self.teams}
+            for group in groups:
+                # No pot or division has more than 8 teams, so a group
+                # holds at most one of each
+                pots = Counter(teams[team_name][1] for team_name in group)
+                divisions = Counter(teams[team_name][0] for team_name in group)
+                self.assertLessEqual(max(pots.values()), 1)
+                self.assertLessEqual(max(divisions.values()), 1)
+
+    def test_same_seed_same_draw(self):
+        self.assertEqual(
+            bot.draw_groups(self.teams, GROUP_COUNT, random.Random(2941)),
+            bot.draw_groups(self.teams, GROUP_COUNT, random.Random(2941)))
+
+
+if __name__ == '__main__':
+    unittest.main()
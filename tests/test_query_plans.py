@@ -0,0 +1,86 @@
+# Query plan regression tests: every hot query must use an index on a
+# league with 10k teams.
+import os
+import random
+import tempfile
+import unittest
+
+from support import import_bot
+
+TEAM_COUNT = 10000
+TEAM_SIZE = 5
+MATCH_COUNT = 20000
+
+
+def setUpModule():
+    global bot
+    bot = import_bot()
+
+
+def build_league(league):
+    rng = random.Random(0)
+    teams = [f"Team {t}" for t in range(TEAM_COUNT)]
+    cursor = league.cursor
+    cursor.execute("BEGIN")
+    cursor.executemany(
+        "INSERT INTO teams (team_name, captain_id, division) VALUES (?, ?, ?)",
+        [(team_name, t * TEAM_SIZE, f"Division {t % 4 + 1}")
+         for t, team_name in enumerate(teams)])
+    cursor.executemany(
+        "INSERT INTO team_captains (captain_id, team_name) VALUES (?, ?)",
+        [(t * TEAM_SIZE, team_name) for t, team_name in enumerate(teams)])
+    cursor.executemany(
+        "INSERT INTO team_players (team_name, player_id, position) VALUES (?, ?, ?)",
+        [(teams[p // TEAM_SIZE], p, p % TEAM_SIZE)
+         for p in range(TEAM_COUNT * TEAM_SIZE)])
+    cursor.executemany(
+        "INSERT INTO player_stats (player_id, goals, assists, saves, champions_league_goals, champions_league_assists, champions_league_saves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(p, *(rng.randint(0, 50) for _ in range(6)))
+         for p in range(TEAM_COUNT * TEAM_SIZE)])
+    cursor.executemany(
+        "INSERT INTO standings (team_name, wins, losses, draws, points) VALUES (?, ?, ?, ?, ?)",
+        [(team_name, 1, 1, 1, 4) for team_name in teams])
+    cursor.executemany(
+        "INSERT INTO scheduled_matches (match_id, team1_name, team2_name, scheduled_time, status) VALUES (?, ?, ?, ?, ?)",
+        [(m, rng.choice(teams), rng.choice(teams),
+          f"2025-01-{m % 28 + 1:02d} 20:00:00",
+          'completed' if m % 2 else 'scheduled')
+         for m in range(1, MATCH_COUNT + 1)])
+    cursor.executemany(
+        "INSERT INTO player_match_stats (match_id, competition, player_id, team, goals, assists, saves) VALUES (?, 'league', ?, ?, 1, 0, 0)",
+        [(m, p, teams[p // TEAM_SIZE]) for m in range(1, MATCH_COUNT + 1, 2)
+         for p in rng.sample(range(TEAM_COUNT * TEAM_SIZE), 4)])
+    cursor.execute("COMMIT")
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.TemporaryDirectory()
+        cls.league = bot.LeagueData(os.path.join(cls.workdir.name, "plans.db"))
+        build_league(cls.league)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.league.close()
+        cls.workdir.cleanup()
+
+    def test_every_hot_query_is_checked(self):
+        self.assertIn('list_matches', bot.HOT_QUERIES)
+        self.assertIn('leaderboard league total', bot.HOT_QUERIES)
+
+    def test_no_full_scans(self):
+        self.assertEqual(self.league.check_query_plans(), [])
+
+    def test_no_full_scans_after_analyze(self):
+        # Table statistics must not talk the planner into a scan either
+        self.league.cursor.execute("ANALYZE")
+        try:
+            self.assertEqual(self.league.check_query_plans(), [])
+        finally:
+            self.league.cursor.execute("DROP TABLE IF EXISTS sqlite_stat1")
+
+
+if __name__ == '__main__':
+    unittest.main()
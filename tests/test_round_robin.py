@@ -0,0 +1,56 @@
+# Fixture generation: every pair meets once at each ground and nobody plays
+# more than two home or two away games in a row.
+import unittest
+
+from support import import_bot
+
+MAX_TEAMS = 20
+
+
+def setUpModule():
+    global bot
+    bot = import_bot()
+
+
+def longest_run(rounds, team):
+    # Longest streak of consecutive home or away games; byes don't count
+    sides = [
+        home == team for pairs in rounds for home, away in pairs
+        if team in (home, away)
+    ]
+    longest = run = 1
+    for previous, side in zip(sides, sides[1:]):
+        run = run + 1 if side == previous else 1
+        longest = max(longest, run)
+    return longest
+
+
+class RoundRobinTest(unittest.TestCase):
+
+    def test_every_pair_meets_home_and_away(self):
+        for count in range(2, MAX_TEAMS + 1):
+            teams = [f"Team {t}" for t in range(count)]
+            rounds = bot.round_robin(teams)
+            pairs = [pair for round_pairs in rounds for pair in round_pairs]
+            self.assertEqual(len(pairs), count * (count - 1))
+            self.assertEqual(len(set(pairs)), len(pairs))
+            for round_pairs in rounds:
+                playing = [team for pair in round_pairs for team in pair]
+                self.assertEqual(len(playing), len(set(playing)))
+
+    def test_empty_and_single_team_divisions(self):
+        self.assertEqual(bot.round_robin([]), [])
+        self.assertEqual(
+            [pairs for pairs in bot.round_robin(["Team 0"]) if pairs], [])
+
+    def test_home_and_away_runs(self):
+        for count in range(2, MAX_TEAMS + 1):
+            teams = [f"Team {t}" for t in range(count)]
+            rounds = bot.round_robin(teams)
+            for team in teams:
+                self.assertLessEqual(longest_run(rounds, team), 2,
+                                     (count, team))
+
+
+if __name__ == '__main__':
+    unittest.main()
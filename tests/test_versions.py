@@ -0,0 +1,52 @@
+# Cached views must not be marked fresh before the rows they show are
+# committed.
+import asyncio
+import os
+import tempfile
+import unittest
+
+from support import import_bot
+
+
+def setUpModule():
+    global bot
+    bot = import_bot()
+
+
+class VersionTest(unittest.TestCase):
+
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.league = bot.LeagueData(os.path.join(workdir.name, "versions.db"))
+        self.addCleanup(self.league.close)
+        self.league.load_data()
+
+    def test_teams_version_moves_after_commit(self):
+
+        async def run():
+            league = self.league
+            before = league.versions['teams']
+            league.add_team("Team A", 1)
+            league.add_player("Team A", 2)
+            self.assertEqual(league.versions['teams'], before)
+            save = asyncio.ensure_future(league.save_data())
+            # A list command reading the database while the write is queued
+            rows = await league.fetchall(
+                "SELECT player_id FROM team_players WHERE team_name = ?",
+                ("Team A", ))
+            version = league.versions['teams']
+            await save
+            # The old rows must not be cached under the new version
+            self.assertTrue(rows or version == before)
+            self.assertGreater(league.versions['teams'], before)
+            self.assertEqual(
+                await league.fetchall(
+                    "SELECT player_id FROM team_players WHERE team_name = ? ORDER BY position",
+                    ("Team A", )), [(1, ), (2, )])
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()